@@ -0,0 +1,253 @@
+#!/usr/bin/python
+##########################################################################
+# PhotoFlow benchmarks: Geo Scooper
+##########################################################################
+# (c) 2026 Rose Midford.
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+##########################################################################
+# Usage (from the repository root):
+#   uv run --project geo_scooper benchmarks/bench_geo_scooper.py
+##########################################################################
+
+import sys
+import datetime
+
+from benchlib import benchmark, run_benchmarks, project_path, quiet, fresh_dir
+
+project_path('geo_scooper')
+import geo_scooper
+from output_formats import KMLWriter, OUTPUT_FORMATS
+from coordinates import dms_to_decimal, check_coordinates
+from clustering import Clusterer
+from tracks import Tracker
+from places import Gazetteer
+
+##########################################################################
+
+def scoop(*args: str):
+    """Run geo_scooper.main() with the given command line."""
+    # main() only sets the globals that are on the command line,
+    # so reset them to the defaults first.
+    geo_scooper.verbose_mode = False
+    geo_scooper.cache_file = None
+    geo_scooper.caching = False
+    geo_scooper.cache = None
+    geo_scooper.jobs = 1
+    geo_scooper.prune = False
+    geo_scooper.full_scan = False
+    geo_scooper.output_format = None
+    geo_scooper.cluster_levels = None
+    geo_scooper.tracks = False
+    geo_scooper.places_file = None
+    geo_scooper.gazetteer = None
+    geo_scooper.since = None
+    geo_scooper.until = None
+    geo_scooper.bbox = None
+    geo_scooper.from_cache = False
+    sys.argv = ['geo_scooper.py', *args]
+    geo_scooper.main()
+
+@benchmark('scoop')
+def bench_scoop(corpus, timer):
+    output = fresh_dir(corpus.root / 'geo') / 'scoop.kml'
+    with quiet(), timer():
+        scoop('-i', str(corpus.library), '-o', str(output))
+
+@benchmark('scoop_jobs')
+def bench_scoop_jobs(corpus, timer):
+    # Same as scoop, with a worker process per core.
+    output = fresh_dir(corpus.root / 'geo') / 'scoop.kml'
+    with quiet(), timer():
+        scoop('-i', str(corpus.library), '-o', str(output), '-j', '0')
+
+@benchmark('scoop_cold_cache')
+def bench_scoop_cold_cache(corpus, timer):
+    work = fresh_dir(corpus.root / 'geo')
+    with quiet(), timer():
+        scoop('-i', str(corpus.library), '-o', str(work / 'scoop.kml'),
+              '-c', str(work / 'cache'))
+
+@benchmark('scoop_warm_cache')
+def bench_scoop_warm_cache(corpus, timer):
+    work = fresh_dir(corpus.root / 'geo')
+    args = ('-i', str(corpus.library), '-o', str(work / 'scoop.kml'),
+            '-c', str(work / 'cache'))
+    with quiet():
+        scoop(*args)
+        with timer():
+            scoop(*args)
+
+@benchmark('scoop_warm_full_scan')
+def bench_scoop_warm_full_scan(corpus, timer):
+    # Warm cache, but every folder listed anyway.
+    work = fresh_dir(corpus.root / 'geo')
+    args = ('-i', str(corpus.library), '-o', str(work / 'scoop.kml'),
+            '-c', str(work / 'cache'))
+    with quiet():
+        scoop(*args)
+        with timer():
+            scoop(*args, '--full-scan')
+
+@benchmark('scoop_warm_query')
+def bench_scoop_warm_query(corpus, timer):
+    # Warm cache, but only half a month's worth of photos from around Oulu.
+    work = fresh_dir(corpus.root / 'geo')
+    args = ('-i', str(corpus.library), '-o', str(work / 'scoop.kml'),
+            '-c', str(work / 'cache'))
+    with quiet():
+        scoop(*args)
+        with timer():
+            scoop(*args, '--since', '2025-06-10', '--until', '2025-06-25', '--bbox', '25.3,64.9,25.6,65.1')
+
+@benchmark('scoop_from_cache')
+def bench_scoop_from_cache(corpus, timer):
+    # The same, answered by the cache alone.
+    work = fresh_dir(corpus.root / 'geo')
+    args = ('-i', str(corpus.library), '-o', str(work / 'scoop.kml'),
+            '-c', str(work / 'cache'))
+    with quiet():
+        scoop(*args)
+        with timer():
+            scoop(*args, '--since', '2025-06-10', '--until', '2025-06-25', '--bbox', '25.3,64.9,25.6,65.1',
+                  '--from-cache')
+
+@benchmark('scoop_memory')
+def bench_scoop_memory(corpus, timer):
+    # The whole scoop, folders to output file, with a cold cache. Nothing
+    # should pile up with the size of the library.
+    work = fresh_dir(corpus.root / 'geo')
+    with quiet(), timer.memory():
+        scoop('-i', str(corpus.library), '-o', str(work / 'scoop.kml'), '-c', str(work / 'cache'))
+
+@benchmark('kml_memory')
+def bench_kml_memory(corpus, timer):
+    # Writing 100k placemarks, without reading any photos. (tracemalloc
+    # doesn't see what libxml2 allocates, only what piles up on the
+    # Python side.)
+    output = fresh_dir(corpus.root / 'geo') / 'memory.kml'
+    date = datetime.datetime(2025, 7, 1)
+    with timer.memory(), KMLWriter(str(output)) as writer:
+        for n in range(100000):
+            name = f"IMG_{n:06d}.jpg"
+            writer.add(name, f"/photos/{name}", date, 65.0 + n * 1e-6, 25.5)
+
+def made_up_coordinates(count=100000):
+    """Exif style coordinates around Oulu: 12 integers for each."""
+    return [(65, 1, n % 60, 1, n % 6000, 100, 25, 1, (n // 60) % 60, 1, (n * 7) % 6000, 100)
+            for n in range(count)]
+
+@benchmark('coords_per_file')
+def bench_coords_per_file(corpus, timer):
+    # Exif strings, parsed one file at a time, as the scoop used to do.
+    coords = [(f"{a}/{b} {c}/{d} {e}/{f}", f"{g}/{h} {i}/{j} {k}/{l}")
+              for a, b, c, d, e, f, g, h, i, j, k, l in made_up_coordinates()]
+    with timer():
+        for lat, lon in coords:
+            kml_lat, kml_lon = geo_scooper.parse_exif_coords(lat, lon, 'N', 'E')
+            if kml_lat == 0.0 and kml_lon == 0.0:
+                continue
+
+@benchmark('coords_batch')
+def bench_coords_batch(corpus, timer):
+    # The same, converted a chunk at a time.
+    coords = made_up_coordinates()
+    refs = [('N', 'E')] * len(coords)
+    size = geo_scooper.CHUNK_SIZE
+    with timer():
+        for start in range(0, len(coords), size):
+            lat, lon, valid = dms_to_decimal(coords[start:start + size], refs[start:start + size])
+            check_coordinates(lat, lon)
+
+def write_points(writer_class, output, count=100000):
+    """Write a bunch of made up photos around Oulu."""
+    date = datetime.datetime(2025, 7, 1)
+    with writer_class(str(output)) as writer:
+        for n in range(count):
+            name = f"IMG_{n:06d}.jpg"
+            writer.add(name, f"/photos/2025/07/01/{name}", date + datetime.timedelta(seconds=n),
+                       65.0 + (n % 1000) * 1.234567e-4, 25.4 + (n // 1000) * 2.345678e-4)
+
+def format_benchmark(output_format: str):
+    # One benchmark per output format: write_kml, write_geojson, ...
+    @benchmark(f'write_{output_format}')
+    def bench_write(corpus, timer):
+        output = fresh_dir(corpus.root / 'geo') / f'points.{output_format}'
+        with timer():
+            write_points(OUTPUT_FORMATS[output_format], output)
+        timer.output_size(output)
+
+for output_format in OUTPUT_FORMATS:
+    format_benchmark(output_format)
+
+class CollectedKML:
+    """Clusterer or Tracker that writes itself out to a KML file at the end,
+    so that it can go through write_points() like the writers do."""
+
+    def __init__(self, collector, output_file):
+        self.collector = collector
+        self.output_file = output_file
+
+    def __enter__(self):
+        return self.collector
+
+    def __exit__(self, *exc):
+        with KMLWriter(self.output_file) as writer:
+            self.collector.write(writer)
+
+@benchmark('write_clustered')
+def bench_write_clustered(corpus, timer):
+    # The same 100k points as write_kml, clustered at three levels.
+    output = fresh_dir(corpus.root / 'geo') / 'clustered.kml'
+    with timer():
+        write_points(lambda output: CollectedKML(Clusterer([3, 5, 7]), output), output)
+    timer.output_size(output)
+
+@benchmark('write_tracks')
+def bench_write_tracks(corpus, timer):
+    # The same 100k points as write_kml, as daily tracks simplified to 10 m.
+    output = fresh_dir(corpus.root / 'geo') / 'tracks.kml'
+    with timer():
+        write_points(lambda output: CollectedKML(Tracker(10.0), output), output)
+    timer.output_size(output)
+
+def made_up_gazetteer(path, count=100000):
+    """A GeoNames style file, with places scattered around Finland."""
+    with open(path, 'w', encoding='utf-8') as file:
+        for n in range(count):
+            lat = 60.0 + (n * 7919 % count) / count * 10.0
+            lon = 20.0 + (n * 104729 % count) / count * 12.0
+            file.write(f"{n}\tPlace {n}\tPlace {n}\t\t{lat:.5f}\t{lon:.5f}\tP\tPPL\tFI"
+                       f"\t\t\t\t\t\t0\t\t0\tEurope/Helsinki\t2026-01-01\n")
+
+@benchmark('places_build')
+def bench_places_build(corpus, timer):
+    # Reading a 100k place gazetteer and building the tree, no cache.
+    work = fresh_dir(corpus.root / 'geo')
+    made_up_gazetteer(work / 'places.txt')
+    with timer():
+        Gazetteer.load(str(work / 'places.txt'))
+
+@benchmark('places_cached')
+def bench_places_cached(corpus, timer):
+    # The same, with the tree already in the cache.
+    work = fresh_dir(corpus.root / 'geo')
+    made_up_gazetteer(work / 'places.txt')
+    Gazetteer.load(str(work / 'places.txt'), str(work / 'cache'))
+    with timer():
+        Gazetteer.load(str(work / 'places.txt'), str(work / 'cache'))
+
+@benchmark('places_lookup')
+def bench_places_lookup(corpus, timer):
+    # Place names for 100k photos, a chunk at a time.
+    work = fresh_dir(corpus.root / 'geo')
+    made_up_gazetteer(work / 'places.txt')
+    gazetteer = Gazetteer.load(str(work / 'places.txt'))
+    lat, lon, _ = dms_to_decimal(made_up_coordinates(), [('N', 'E')] * 100000)
+    size = geo_scooper.CHUNK_SIZE
+    with timer():
+        for start in range(0, len(lat), size):
+            gazetteer.lookup(lat[start:start + size], lon[start:start + size])
+
+if __name__ == '__main__':
+    run_benchmarks("Geo Scooper benchmarks.")
@@ -0,0 +1,200 @@
+#!/usr/bin/python
+##########################################################################
+# PhotoFlow benchmarks: Photo Importinator
+##########################################################################
+# (c) 2026 Rose Midford.
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+##########################################################################
+# Usage (from the repository root):
+#   uv run --project photo_importinator benchmarks/bench_photo_importinator.py
+##########################################################################
+
+import os, sys
+import shutil
+import datetime
+import subprocess
+from pathlib import Path
+
+from benchlib import benchmark, run_benchmarks, project_path, quiet, fresh_dir
+
+project_path('photo_importinator')
+import archival
+import scheduler
+from configuration import Configuration
+from running_stats import RunningStats
+from photo_processing import ImportQueue, MoveTask
+
+##########################################################################
+
+def make_config(corpus, camera: str, action=Configuration.Action.IMPORT) -> Configuration:
+    """Configuration for importing from the corpus. Originals are left in
+    place and targets overwritten, so the benchmarks can be repeated."""
+    config = Configuration()
+    config.action = action
+    config.configuration_file = corpus.config_file
+    config.camera = camera
+    config.date = datetime.datetime(2025, 7, 1)
+    config.leave_originals = True
+    config.overwrite_target = True
+    config.read_configuration()
+    config.parse_configuration()
+    if config.is_cloud_source():
+        config.find_source_path()
+    else:
+        # find_source_path() expects a drive letter for cards.
+        config.source_path = corpus.dcim
+    config.validate()
+    return config
+
+def make_queue(config: Configuration) -> ImportQueue:
+    return ImportQueue(config)
+
+@benchmark('populate_card')
+def bench_populate_card(corpus, timer):
+    queue = make_queue(make_config(corpus, corpus.card_camera))
+    with quiet(), timer():
+        queue.populate()
+
+@benchmark('populate_cloud')
+def bench_populate_cloud(corpus, timer):
+    queue = make_queue(make_config(corpus, corpus.cloud_camera))
+    with quiet(), timer():
+        queue.populate()
+
+@benchmark('run_card')
+def bench_run_card(corpus, timer):
+    config = make_config(corpus, corpus.card_camera)
+    config.target_path = fresh_dir(corpus.target / 'run_card')
+    queue = make_queue(config)
+    with quiet():
+        queue.populate()
+        with timer():
+            queue.run()
+
+@benchmark('run_card_cached')
+def bench_run_card_cached(corpus, timer):
+    # Importing the same card again, with the conversion cache warmed up.
+    config = make_config(corpus, corpus.card_camera)
+    config.conversion_cache_path = corpus.root / 'dng_cache'
+    config.target_path = corpus.target / 'run_card_cached'
+    if not config.conversion_cache_path.exists():
+        fresh_dir(config.target_path)
+        queue = make_queue(config)
+        with quiet():
+            queue.populate()
+            queue.run()
+    fresh_dir(config.target_path)
+    queue = make_queue(config)
+    with quiet():
+        queue.populate()
+        with timer():
+            queue.run()
+
+@benchmark('stream_card')
+def bench_stream_card(corpus, timer):
+    # Same work as populate_card + run_card, but overlapped.
+    config = make_config(corpus, corpus.card_camera)
+    config.target_path = fresh_dir(corpus.target / 'stream_card')
+    config.queue_streaming = True
+    queue = make_queue(config)
+    with quiet(), timer():
+        queue.run_streaming()
+
+@benchmark('run_card_lanes')
+def bench_run_card_lanes(corpus, timer):
+    # Same as run_card, with the large file lane. The corpus has no files
+    # big enough for it, so the raw files count as large here.
+    config = make_config(corpus, corpus.card_camera)
+    config.target_path = fresh_dir(corpus.target / 'run_card_lanes')
+    config.queue_lanes = True
+    queue = make_queue(config)
+    large_file_size = scheduler.LARGE_FILE_SIZE
+    scheduler.LARGE_FILE_SIZE = min(path.stat().st_size for path in corpus.dcim.rglob('*.NEF'))
+    try:
+        with quiet():
+            queue.populate()
+            with timer():
+                queue.run()
+    finally:
+        scheduler.LARGE_FILE_SIZE = large_file_size
+
+@benchmark('run_two_sources')
+def bench_run_two_sources(corpus, timer):
+    # The card and the cloud folder imported in one queue, like
+    # "import CARD CLOUD" does.
+    card = make_config(corpus, corpus.card_camera)
+    card.target_path = fresh_dir(corpus.target / 'run_two_sources')
+    cloud = make_config(corpus, corpus.cloud_camera)
+    cloud.target_path = card.target_path
+    queue = make_queue(card)
+    queue.add_source(cloud)
+    with quiet(), timer():
+        queue.populate()
+        queue.run()
+
+@benchmark('plan_memory')
+def bench_plan_memory(corpus, timer):
+    # Planning memory for a big cloud folder: 100k tasks, without
+    # touching the disk for each one.
+    queue = make_queue(make_config(corpus, corpus.cloud_camera))
+    source = corpus.cloud
+    date = datetime.datetime(2025, 7, 1)
+    target = queue._config.target_path / queue._config.date_to_path(date)
+    with timer.memory():
+        for n in range(100000):
+            name = f"IMG_{n:06d}.jpg"
+            queue.jobs.append(MoveTask(queue.settings, source / name, target / name, date, 5000000, 0))
+
+@benchmark('archive')
+def bench_archive(corpus, timer):
+    output = fresh_dir(corpus.backup / 'archive') / 'bench.7z'
+    with quiet(), timer():
+        archival.archive(corpus.dcim, output)
+
+@benchmark('unpack_all')
+def bench_unpack_all(corpus, timer):
+    config = make_config(corpus, corpus.unpack_camera, Configuration.Action.UNPACK)
+    fresh_dir(config.source_path)
+    for z in corpus.cloud_zips.iterdir():
+        shutil.copy(z, config.source_path)
+    with quiet(), timer():
+        archival.unpack_all(config)
+
+@benchmark('running_stats')
+def bench_running_stats(corpus, timer):
+    config = make_config(corpus, corpus.card_camera)
+    day = datetime.date(2000, 1, 1)
+    with quiet(), timer():
+        stats = RunningStats(config)
+        for n in range(100000):
+            stats.increment_day(day + datetime.timedelta(days=n % 3650))
+        stats.save()
+        RunningStats(config).list_all()
+
+def cli(corpus, *args: str):
+    """Run Photo Importinator in a new process, like from the shell."""
+    script = Path(__file__).resolve().parent.parent / 'photo_importinator' / 'photo_importinator.py'
+    env = dict(os.environ)
+    # Keep the real log file intact, and start with no running stats.
+    env['PHOTO_IMPORTINATOR_LOGFILE'] = str(corpus.root / 'photo_importinator.log')
+    env['XDG_CONFIG_HOME'] = str(corpus.root / 'cli_config_home')
+    subprocess.run([sys.executable, str(script), *args], env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+
+# Startup benchmarks: these commands only read the configuration file,
+# so nearly all of the time goes to starting up the interpreter and
+# importing modules.
+
+@benchmark('startup_list')
+def bench_startup_list(corpus, timer):
+    with timer():
+        cli(corpus, 'list', '-C', str(corpus.config_file))
+
+@benchmark('startup_stats')
+def bench_startup_stats(corpus, timer):
+    with timer():
+        cli(corpus, 'stats', '-C', str(corpus.config_file))
+
+if __name__ == '__main__':
+    run_benchmarks("Photo Importinator benchmarks.")
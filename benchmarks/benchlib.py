@@ -0,0 +1,138 @@
+#!/usr/bin/python
+##########################################################################
+# PhotoFlow benchmarks: Benchmark harness
+##########################################################################
+# (c) 2026 Rose Midford.
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+##########################################################################
+
+import os, sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import contextlib
+import tracemalloc
+from pathlib import Path
+
+from make_corpus import build_corpus, corpus_paths, add_spec_arguments, spec_from_arguments
+
+##########################################################################
+
+class Timer:
+    """Passed to the benchmark functions. The benchmark does its setup,
+    and then times the interesting bit with `with timer(): ...`.
+    Memory benchmarks use `with timer.memory(): ...` instead. Benchmarks
+    that write files can also record the size with `timer.output_size()`."""
+
+    def __init__(self):
+        self.times: list[float] = []
+        self.peaks: list[int] = []
+        self.sizes: list[int] = []
+
+    @contextlib.contextmanager
+    def __call__(self):
+        start = time.perf_counter()
+        yield
+        self.times.append(time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def memory(self):
+        """Record the peak memory allocated by Python within the block."""
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.peaks.append(peak)
+
+    def output_size(self, path: Path):
+        """Record the size of an output file."""
+        self.sizes.append(path.stat().st_size)
+
+# Benchmark name -> function(corpus, timer)
+benchmarks: dict = {}
+
+def benchmark(name: str):
+    """Decorator that registers a benchmark function."""
+    def register(fn):
+        benchmarks[name] = fn
+        return fn
+    return register
+
+def project_path(project: str):
+    """Make the modules of a PhotoFlow subproject importable."""
+    path = str(Path(__file__).resolve().parent.parent / project)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+@contextlib.contextmanager
+def quiet():
+    """Send stdout to the bit bucket. Console output still gets rendered,
+    so its cost is still included in the timings."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def fresh_dir(path: Path) -> Path:
+    """Empty out (or create) a directory."""
+    if path.exists():
+        shutil.rmtree(path)
+    path.mkdir(parents=True)
+    return path
+
+##########################################################################
+
+def report(name: str, timer: Timer):
+    if timer.peaks:
+        peaks = [peak / (1024 * 1024) for peak in timer.peaks]
+        print(f"{name:<28} peak memory {statistics.median(peaks):9.1f} MiB  (n={len(peaks)})")
+    if timer.sizes:
+        sizes = [size / (1024 * 1024) for size in timer.sizes]
+        print(f"{name:<28} output size {statistics.median(sizes):9.1f} MiB  (n={len(sizes)})")
+    times = timer.times
+    if times:
+        print(f"{name:<28} min {min(times):9.4f}s  "
+              f"median {statistics.median(times):9.4f}s  "
+              f"max {max(times):9.4f}s  (n={len(times)})")
+    if not times and not timer.peaks:
+        print(f"{name:<28} (no timings)")
+
+def run_benchmarks(description: str):
+    """Parse the command line, build (or reuse) a corpus, and run the
+    registered benchmarks."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--corpus', type=Path, default=None,
+                        help="Use (or create) the corpus in this directory. "
+                             "Default: temporary directory, deleted afterwards.")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', action='append', default=None,
+                        choices=sorted(benchmarks.keys()),
+                        help="Run only the named benchmark(s).")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        if args.corpus is None:
+            root = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix='photoflow_bench_')))
+        else:
+            root = args.corpus
+        # Keep benchmarks from touching the real configuration directory
+        # (running stats and such).
+        os.environ['XDG_CONFIG_HOME'] = str(root / 'config_home')
+        (root / 'config_home' / 'photo_importinator').mkdir(parents=True, exist_ok=True)
+        if (root / 'photo_importinator_config.toml').exists():
+            print(f"Reusing corpus in {root}")
+            corpus = corpus_paths(root)
+        else:
+            print(f"Generating corpus in {root}...")
+            start = time.perf_counter()
+            corpus = build_corpus(root, spec_from_arguments(args))
+            print(f"Corpus generated in {time.perf_counter() - start:.1f}s")
+        for name in (args.only or benchmarks.keys()):
+            timer = Timer()
+            for _ in range(args.repeat):
+                benchmarks[name](corpus, timer)
+            report(name, timer)
@@ -0,0 +1,33 @@
+#!/usr/bin/python
+##########################################################################
+# PhotoFlow benchmarks: dnglab stand-in
+##########################################################################
+# (c) 2026 Rose Midford.
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+##########################################################################
+# Pretends to be dnglab, so that the conversion path can be benchmarked
+# without the real thing. "Converting" is just copying the file.
+#
+# Usage: fake_dnglab.py convert [flags...] SOURCE TARGET
+##########################################################################
+
+import sys
+import shutil
+
+def main() -> int:
+    args = sys.argv[1:]
+    if args[:1] == ['--version']:
+        print("dnglab 0.0.0-fake")
+        return 0
+    if len(args) < 3 or args[0] != 'convert':
+        print("Usage: fake_dnglab.py convert [flags...] SOURCE TARGET", file=sys.stderr)
+        return 2
+    source, target = args[-2], args[-1]
+    shutil.copyfile(source, target)
+    # Photo Importinator looks for this in the output.
+    print("Converted 1/1 files")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,349 @@
+#!/usr/bin/python
+##########################################################################
+# PhotoFlow benchmarks: Synthetic DCIM corpus generator
+##########################################################################
+# (c) 2026 Rose Midford.
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+##########################################################################
+# Builds a reproducible pile of fake photos for benchmarking:
+#
+#   card/DCIM/100NIKON/DSC_0001.NEF, DSC_0001.JPG, ...   (a camera card)
+#   cloud/PXL_20250601_123456000.jpg, ...                (a phone cloud folder)
+#   cloud_zips/Camera_001.zip, ...                       (zips for unpacking)
+#   unpack/                                              (where they're unpacked)
+#   library/2025/06/01/DSC_0001.JPG, ...                 (a NAS library)
+#   photo_importinator_config.toml                       (config for the above)
+#   dnglab                                               (dnglab stand-in)
+#
+# The images are tiny, but they are real JPEG/TIFF files that Exiv2 can
+# read, with capture dates, GPS coordinates and ratings. They're padded to
+# the requested size with random bytes.
+#
+# Same seed, same corpus.
+#
+# Usage: python make_corpus.py OUTPUTDIR [--files N] [--seed S] [...]
+##########################################################################
+
+import os, sys
+import stat
+import struct
+import random
+import argparse
+import datetime
+from pathlib import Path
+from dataclasses import dataclass
+from zipfile import ZipFile
+
+import exiv2
+
+##########################################################################
+
+@dataclass
+class CorpusSpec:
+    """What to put in the corpus. Sizes are in bytes."""
+    seed: int = 1
+    card_files: int = 200           # NEF+JPG pairs on the card
+    files_per_folder: int = 999     # Like cameras do: 100NIKON, 101NIKON...
+    cloud_files: int = 100          # Phone photos in the cloud folder
+    zips: int = 2                   # Zip files for the unpack command...
+    files_per_zip: int = 20         # ...and how many JPEGs each holds
+    library_files: int = 500        # Photos in the YYYY/MM/DD library
+    raw_size: int = 256 * 1024
+    jpeg_size: int = 64 * 1024
+    gps_fraction: float = 0.8       # How many photos have coordinates
+    rated_fraction: float = 0.1     # How many photos have a star rating
+    start_date: datetime.datetime = datetime.datetime(2025, 6, 1, 9, 0, 0)
+    days: int = 30                  # Photos are spread over this many days
+    # Photos are scattered around here. Oulu, naturally.
+    centre: tuple[float, float] = (65.0121, 25.4651)
+
+@dataclass
+class Corpus:
+    """Where the generated corpus ended up."""
+    root: Path
+    card: Path
+    dcim: Path
+    cloud: Path
+    cloud_zips: Path
+    unpack: Path
+    library: Path
+    target: Path
+    backup: Path
+    config_file: Path
+    dnglab: Path
+    # Camera names in the generated configuration file
+    card_camera: str = 'Bench_Nikon'
+    cloud_camera: str = 'Bench_Phone'
+    unpack_camera: str = 'Bench_Unpack'
+
+##########################################################################
+
+def minimal_tiff() -> bytes:
+    """Returns a valid 1x1 pixel greyscale TIFF. Nikon NEF (like most raw
+    formats) is TIFF underneath, so this will pass for one as far as
+    Exiv2 is concerned."""
+    # (tag, type, count, value) - type 3 is SHORT, 4 is LONG
+    entries = [(256, 3, 1, 1),   # ImageWidth
+               (257, 3, 1, 1),   # ImageLength
+               (258, 3, 1, 8),   # BitsPerSample
+               (259, 3, 1, 1),   # Compression: none
+               (262, 3, 1, 1),   # PhotometricInterpretation: black is zero
+               (273, 4, 1, 0),   # StripOffsets (filled in below)
+               (277, 3, 1, 1),   # SamplesPerPixel
+               (278, 3, 1, 1),   # RowsPerStrip
+               (279, 4, 1, 1)]   # StripByteCounts
+    ifd_offset = 8
+    data_offset = ifd_offset + 2 + len(entries) * 12 + 4
+    tiff = bytearray(b'II*\x00' + struct.pack('<I', ifd_offset))
+    tiff += struct.pack('<H', len(entries))
+    for tag, typ, count, value in entries:
+        if tag == 273:
+            value = data_offset
+        if typ == 3:
+            tiff += struct.pack('<HHIHH', tag, typ, count, value, 0)
+        else:
+            tiff += struct.pack('<HHII', tag, typ, count, value)
+    tiff += struct.pack('<I', 0)
+    tiff += b'\x80'
+    return bytes(tiff)
+
+def exif_rational_dms(value: float) -> str:
+    """Converts decimal degrees to an Exif degrees/minutes/seconds string."""
+    # In hundredths of an arc second
+    total = round(abs(value) * 3600 * 100)
+    degrees, total = divmod(total, 3600 * 100)
+    minutes, seconds = divmod(total, 60 * 100)
+    return f"{degrees}/1 {minutes}/1 {seconds}/100"
+
+class ImageMaker:
+    """Writes the fake images. Keeps the random state, so that the
+    same seed always results in the same files."""
+
+    def __init__(self, spec: CorpusSpec):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+
+    def random_date(self) -> datetime.datetime:
+        offset = self.rng.randrange(self.spec.days * 24 * 60 * 60)
+        return self.spec.start_date + datetime.timedelta(seconds=offset)
+
+    def random_location(self) -> tuple[float, float] | None:
+        if self.rng.random() >= self.spec.gps_fraction:
+            return None
+        lat, lon = self.spec.centre
+        return lat + self.rng.uniform(-0.05, 0.05), lon + self.rng.uniform(-0.1, 0.1)
+
+    def random_rating(self) -> int:
+        if self.rng.random() >= self.spec.rated_fraction:
+            return 0
+        return self.rng.randint(1, 5)
+
+    def write(self, path: Path, date: datetime.datetime,
+              location: tuple[float, float] | None, rating: int, size: int):
+        """Writes an image with the given metadata, padded to `size` bytes."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix.upper() in ('.JPG', '.JPEG'):
+            img = exiv2.ImageFactory.create(exiv2.ImageType.jpeg, str(path))
+        else:
+            path.write_bytes(minimal_tiff())
+            img = exiv2.ImageFactory.open(str(path))
+            img.readMetadata()
+        # Both of these are references; writeMetadata() saves the changes.
+        exif = img.exifData()
+        exif["Exif.Image.Make"] = "NIKON CORPORATION"
+        exif["Exif.Photo.DateTimeOriginal"] = date.strftime('%Y:%m:%d %H:%M:%S')
+        if location is not None:
+            lat, lon = location
+            exif["Exif.GPSInfo.GPSLatitudeRef"] = 'N' if lat >= 0 else 'S'
+            exif["Exif.GPSInfo.GPSLatitude"] = exif_rational_dms(lat)
+            exif["Exif.GPSInfo.GPSLongitudeRef"] = 'E' if lon >= 0 else 'W'
+            exif["Exif.GPSInfo.GPSLongitude"] = exif_rational_dms(lon)
+        if rating != 0:
+            xmp = img.xmpData()
+            xmp["Xmp.xmp.Rating"] = str(rating)
+        img.writeMetadata()
+        # Pad the file. Trailing junk after the image data doesn't bother
+        # Exiv2 (or anything else, really). The padding is different for
+        # every file, so it compresses about as badly as real photos do.
+        padding = size - path.stat().st_size
+        if padding > 0:
+            with open(path, 'ab') as f:
+                while padding > 0:
+                    chunk = min(padding, 1024 * 1024)
+                    f.write(self.rng.randbytes(chunk))
+                    padding -= chunk
+        # Cameras set the file time to the capture time. So do we.
+        ts = date.timestamp()
+        os.utime(path, (ts, ts))
+
+##########################################################################
+
+def make_card(maker: ImageMaker, dcim: Path):
+    """Camera card: NEF+JPG pairs in DCIM/100NIKON, DCIM/101NIKON, ..."""
+    spec = maker.spec
+    dates = sorted(maker.random_date() for _ in range(spec.card_files))
+    for n, date in enumerate(dates):
+        folder = dcim / f"{100 + n // spec.files_per_folder}NIKON"
+        number = n % 9999 + 1
+        location = maker.random_location()
+        rating = maker.random_rating()
+        maker.write(folder / f"DSC_{number:04d}.NEF", date, location, rating, spec.raw_size)
+        maker.write(folder / f"DSC_{number:04d}.JPG", date, location, rating, spec.jpeg_size)
+    # The Nikon mystery file that the configuration tells us to ignore.
+    (dcim / "NC_FLLST.DAT").write_bytes(b'\x00' * 64)
+
+def phone_name(date: datetime.datetime, n: int) -> str:
+    return f"PXL_{date.strftime('%Y%m%d_%H%M%S')}{n % 1000:03d}.jpg"
+
+def make_cloud(maker: ImageMaker, cloud: Path, cloud_zips: Path):
+    """Phone cloud folder: loose JPEGs, plus zipped-up batches of them."""
+    spec = maker.spec
+    for n in range(spec.cloud_files):
+        date = maker.random_date()
+        maker.write(cloud / phone_name(date, n), date,
+                    maker.random_location(), maker.random_rating(), spec.jpeg_size)
+    staging = cloud_zips / "staging"
+    for z in range(spec.zips):
+        with ZipFile(cloud_zips / f"Camera_{z + 1:03d}.zip", 'w') as zf:
+            for n in range(spec.files_per_zip):
+                date = maker.random_date()
+                file = staging / phone_name(date, z * spec.files_per_zip + n)
+                maker.write(file, date, maker.random_location(),
+                            maker.random_rating(), spec.jpeg_size)
+                zf.write(file, file.name)
+                file.unlink()
+    if staging.exists():
+        staging.rmdir()
+
+def make_library(maker: ImageMaker, library: Path):
+    """NAS library, sorted to YYYY/MM/DD folders like the importer does it."""
+    spec = maker.spec
+    for n in range(spec.library_files):
+        date = maker.random_date()
+        folder = library / f"{date.year:04d}/{date.month:02d}/{date.day:02d}"
+        maker.write(folder / f"DSC_{n % 9999 + 1:04d}.JPG", date,
+                    maker.random_location(), maker.random_rating(), spec.jpeg_size)
+
+def make_dnglab_stub(stub: Path):
+    """Write an executable that pretends to be dnglab (see fake_dnglab.py)."""
+    fake = Path(__file__).resolve().parent / 'fake_dnglab.py'
+    if os.name == 'nt':
+        stub.write_text(f'@"{sys.executable}" "{fake}" %*\r\n')
+    else:
+        stub.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{fake}" "$@"\n')
+        stub.chmod(stub.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+def make_config(corpus: Corpus):
+    """Write a Photo Importinator configuration pointing at the corpus."""
+    corpus.config_file.write_text(f"""# Generated by make_corpus.py
+[Target]
+default = 'BENCH'
+
+[Target.BENCH]
+path = '{corpus.target.as_posix()}'
+backup_path = '{corpus.backup.as_posix()}'
+folder_structure = '{{year:04d}}/{{month:02d}}/{{day:02d}}'
+
+[Conversion]
+dnglab_path = '{corpus.dnglab.as_posix()}'
+convert_flags = ['--dng-thumbnail', 'false']
+
+[Cloud]
+BenchCloud = '{corpus.cloud.as_posix()}'
+BenchUnpack = '{corpus.unpack.as_posix()}'
+
+[Cameras]
+default = 'None'
+
+[Cameras.{corpus.card_camera}]
+card = '{corpus.card.as_posix()}'
+card_label = 'NIKON D780'
+ignore = [ 'NC_FLLST.DAT' ]
+convert_raw = [ '.NEF' ]
+
+[Cameras.{corpus.cloud_camera}]
+card = 'BenchCloud'
+
+[Cameras.{corpus.unpack_camera}]
+card = 'BenchUnpack'
+""", encoding='utf-8')
+
+def corpus_paths(root: Path) -> Corpus:
+    """Where the corpus under `root` goes (or already is)."""
+    root = Path(root).resolve()
+    return Corpus(root=root,
+                  card=root / 'card',
+                  dcim=root / 'card' / 'DCIM',
+                  cloud=root / 'cloud',
+                  cloud_zips=root / 'cloud_zips',
+                  unpack=root / 'unpack',
+                  library=root / 'library',
+                  target=root / 'target',
+                  backup=root / 'backup',
+                  config_file=root / 'photo_importinator_config.toml',
+                  dnglab=root / ('dnglab.cmd' if os.name == 'nt' else 'dnglab'))
+
+def build_corpus(root: Path, spec: CorpusSpec = CorpusSpec()) -> Corpus:
+    """Generate the corpus under `root`, which should be empty or missing."""
+    corpus = corpus_paths(root)
+    for d in (corpus.dcim, corpus.cloud, corpus.cloud_zips, corpus.unpack,
+              corpus.library, corpus.target, corpus.backup):
+        d.mkdir(parents=True, exist_ok=True)
+    maker = ImageMaker(spec)
+    make_card(maker, corpus.dcim)
+    make_cloud(maker, corpus.cloud, corpus.cloud_zips)
+    make_library(maker, corpus.library)
+    make_dnglab_stub(corpus.dnglab)
+    make_config(corpus)
+    return corpus
+
+##########################################################################
+
+def parse_size(size: str) -> int:
+    """Parses sizes like 4096, 64K, 25M."""
+    multipliers = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    size = size.strip().upper()
+    if size and size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+def add_spec_arguments(parser: argparse.ArgumentParser):
+    """Corpus options, shared with the benchmark scripts."""
+    d = CorpusSpec()
+    parser.add_argument('--seed', type=int, default=d.seed)
+    parser.add_argument('--files', type=int, default=d.card_files,
+                        help="NEF+JPG pairs on the card")
+    parser.add_argument('--cloud-files', type=int, default=d.cloud_files)
+    parser.add_argument('--zips', type=int, default=d.zips)
+    parser.add_argument('--files-per-zip', type=int, default=d.files_per_zip)
+    parser.add_argument('--library-files', type=int, default=d.library_files)
+    parser.add_argument('--raw-size', type=parse_size, default=d.raw_size)
+    parser.add_argument('--jpeg-size', type=parse_size, default=d.jpeg_size)
+    parser.add_argument('--days', type=int, default=d.days)
+
+def spec_from_arguments(args: argparse.Namespace) -> CorpusSpec:
+    return CorpusSpec(seed=args.seed,
+                      card_files=args.files,
+                      cloud_files=args.cloud_files,
+                      zips=args.zips,
+                      files_per_zip=args.files_per_zip,
+                      library_files=args.library_files,
+                      raw_size=args.raw_size,
+                      jpeg_size=args.jpeg_size,
+                      days=args.days)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic photo corpus for benchmarks.")
+    parser.add_argument('output', type=Path, help="Output directory")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+    if args.output.exists() and any(args.output.iterdir()):
+        print(f"{args.output} is not empty.")
+        sys.exit(1)
+    corpus = build_corpus(args.output, spec_from_arguments(args))
+    print(f"Corpus generated in {corpus.root}")
+    print(f"Configuration file: {corpus.config_file}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+##########################################################################
+# Photo Geo Scooper: Clustering
+##########################################################################
+# (c) Rose Midford 2026
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+##########################################################################
+
+# Python builtins
+import datetime
+from dataclasses import dataclass
+
+# PyPi packages
+import numpy as np
+
+##########################################################################
+
+# Photos are clustered by geohash cell: at precision 1, the world is split
+# into 32 cells, and each extra character splits each cell into 32 again.
+# Precision 5 cells are about 5 km across, precision 7 about 150 m.
+MIN_PRECISION = 1
+MAX_PRECISION = 12
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# How big (in pixels on screen) a cluster's cell may get before the viewer
+# switches over to the next, finer level.
+LOD_PIXELS = 512
+
+
+@dataclass
+class Cluster:
+    """A bunch of photos in the same geohash cell."""
+    geohash: str
+    # Average position of the photos
+    lat: float
+    lon: float
+    count: int
+    first: datetime.datetime
+    last: datetime.datetime
+    # Bounds of the cell
+    north: float
+    south: float
+    east: float
+    west: float
+    # Name and path of the photo, if there's just the one
+    name: str | None = None
+    path: str | None = None
+
+
+def bits_for(precision: int) -> tuple[int, int]:
+    """Returns how many bits of latitude and longitude a geohash of the
+    given precision has. Longitude gets the odd bit."""
+    bits = precision * 5
+    return bits // 2, bits - bits // 2
+
+
+def geohash_cells(lat, lon, precision: int) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the geohash cell row and column of each point."""
+    lat_bits, lon_bits = bits_for(precision)
+    rows = np.floor((np.asarray(lat) + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64)
+    columns = np.floor((np.asarray(lon) + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64)
+    # The north pole and the antimeridian belong to the last cell.
+    return np.clip(rows, 0, (1 << lat_bits) - 1), np.clip(columns, 0, (1 << lon_bits) - 1)
+
+
+def geohash(row: int, column: int, precision: int) -> str:
+    """Spells out the geohash of a cell. The bits go longitude first, and
+    then take turns."""
+    lat_bits, lon_bits = bits_for(precision)
+    value = 0
+    for bit in range(precision * 5):
+        if bit % 2 == 0:
+            lon_bits -= 1
+            value = (value << 1) | ((column >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            value = (value << 1) | ((row >> lat_bits) & 1)
+    return "".join(GEOHASH_ALPHABET[(value >> (5 * n)) & 31] for n in reversed(range(precision)))
+
+
+def level_of_detail(levels: list[int]) -> list[tuple[int, int]]:
+    """Works out (minLodPixels, maxLodPixels) for each clustering level, so
+    that each level takes over when the previous one's cells get too big
+    on screen. Each geohash character makes the cells about sqrt(32) times
+    smaller across."""
+    lods = []
+    for n, precision in enumerate(levels):
+        if n == 0:
+            min_pixels = 0
+        else:
+            min_pixels = int(LOD_PIXELS / 32 ** ((precision - levels[n - 1]) / 2))
+        max_pixels = LOD_PIXELS if n < len(levels) - 1 else -1
+        lods.append((min_pixels, max_pixels))
+    return lods
+
+
+class Clusterer:
+    """Collects the photos instead of writing them out, and then writes out
+    the clusters. Has the same add() as the output writers, so it can take
+    a writer's place."""
+
+    def __init__(self, levels: list[int]):
+        self.levels = levels
+        self.lats = []
+        self.lons = []
+        self.times = []
+        self.names = []
+        self.paths = []
+
+    def add(self, name: str, path: str, date: datetime.datetime, lat: float, lon: float,
+            place: str | None = None):
+        self.lats.append(lat)
+        self.lons.append(lon)
+        self.times.append(date.timestamp())
+        self.names.append(name)
+        self.paths.append(path)
+
+    def clusters(self, precision: int) -> list[Cluster]:
+        """Clusters the photos at the given precision. The clusters come out
+        in geohash order."""
+        if not self.lats:
+            return []
+        lat = np.asarray(self.lats, dtype=np.float64)
+        lon = np.asarray(self.lons, dtype=np.float64)
+        times = np.asarray(self.times, dtype=np.float64)
+        rows, columns = geohash_cells(lat, lon, precision)
+        lat_bits, lon_bits = bits_for(precision)
+        keys = (rows << lon_bits) | columns
+        # Sort the photos by cell, and then sum up each run of the same cell.
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        counts = np.diff(np.r_[starts, len(keys)])
+        mean_lat = np.add.reduceat(lat[order], starts) / counts
+        mean_lon = np.add.reduceat(lon[order], starts) / counts
+        first = np.minimum.reduceat(times[order], starts)
+        last = np.maximum.reduceat(times[order], starts)
+
+        lat_size = 180.0 / (1 << lat_bits)
+        lon_size = 360.0 / (1 << lon_bits)
+        clusters = []
+        for n, start in enumerate(starts.tolist()):
+            row, column = int(rows[order[start]]), int(columns[order[start]])
+            count = int(counts[n])
+            cluster = Cluster(
+                geohash=geohash(row, column, precision),
+                lat=float(mean_lat[n]), lon=float(mean_lon[n]), count=count,
+                first=datetime.datetime.fromtimestamp(first[n]),
+                last=datetime.datetime.fromtimestamp(last[n]),
+                north=-90.0 + (row + 1) * lat_size, south=-90.0 + row * lat_size,
+                east=-180.0 + (column + 1) * lon_size, west=-180.0 + column * lon_size)
+            if count == 1:
+                cluster.name = self.names[order[start]]
+                cluster.path = self.paths[order[start]]
+            clusters.append(cluster)
+        return clusters
+
+    def write(self, writer):
+        """Writes the clusters out. With just one level, they're just
+        placemarks. With more, each level goes in a folder of its own, and
+        the placemarks get Regions, so that the viewer only shows one level
+        at a time, depending on how far in it has zoomed."""
+        if len(self.levels) == 1:
+            for cluster in self.clusters(self.levels[0]):
+                writer.add_cluster(cluster)
+            return
+        for precision, lod in zip(self.levels, level_of_detail(self.levels)):
+            writer.open_folder(f"Precision {precision}")
+            for cluster in self.clusters(precision):
+                writer.add_cluster(cluster, lod)
+            writer.close()
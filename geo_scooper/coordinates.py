@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+##########################################################################
+# Photo Geo Scooper: Coordinate conversion
+##########################################################################
+# (c) Rose Midford 2026
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+##########################################################################
+
+# PyPi packages
+import numpy as np
+
+##########################################################################
+
+# In Exif data, latitude and longitude are both given as three rationals:
+# degrees, minutes and seconds. Here, a file's coordinates are 12 integers:
+# numerator and denominator of latitude degrees, minutes and seconds, and
+# then the same for longitude. The references are given separately, as a
+# pair of characters ('N' or 'S', 'E' or 'W').
+
+# What check_coordinates() thinks of each pair of coordinates.
+OK = 0
+NULL_ISLAND = 1
+OFF_THE_MAP = 2
+
+
+def dms_to_decimal(rationals, refs) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Converts a batch of Exif coordinates into signed decimal degrees, as
+    used in KML files. Returns the latitudes, the longitudes, and whether
+    each conversion went fine; it doesn't if there's a zero denominator,
+    or a reference that isn't one of the four points of the compass."""
+    r = np.asarray(rationals, dtype=np.float64).reshape(-1, 2, 3, 2)
+    numerators = r[..., 0]
+    denominators = r[..., 1]
+    valid = np.all(denominators != 0, axis=(1, 2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        parts = np.where(denominators != 0, numerators / denominators, 0.0)
+    # Same sums, in the same order, as parse_exif_coords() does.
+    degrees = parts[..., 0] + (parts[..., 1] * (1 / 60)) + (parts[..., 2] * (1 / 60) * (1 / 60))
+
+    refs = np.asarray(refs, dtype="U1").reshape(-1, 2)
+    lat_refs = refs[:, 0]
+    lon_refs = refs[:, 1]
+    valid &= ((lat_refs == "N") | (lat_refs == "S")) & ((lon_refs == "E") | (lon_refs == "W"))
+    # Southern and Western Hemispheres are negative.
+    lat = np.where(lat_refs == "S", -degrees[:, 0], degrees[:, 0])
+    lon = np.where(lon_refs == "W", -degrees[:, 1], degrees[:, 1])
+    return lat, lon, valid
+
+
+def check_coordinates(lat, lon) -> np.ndarray:
+    """Checks a batch of decimal coordinates. Returns OK for the ones that
+    look fine, NULL_ISLAND for the ones at exactly 0,0 (most likely a GPS
+    that didn't have a fix), and OFF_THE_MAP for the ones out of range."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    status = np.full(lat.shape, OK, dtype=np.int8)
+    status[(lat == 0.0) & (lon == 0.0)] = NULL_ISLAND
+    status[~((np.abs(lat) <= 90.0) & (np.abs(lon) <= 180.0))] = OFF_THE_MAP
+    return status
@@ -12,39 +12,22 @@ import os, sys
 import re
 import getopt
 import datetime
-import pickle
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # PyPi packages
 import exiv2
-from lxml import etree
-from pykml.factory import KML_ElementMaker
-from pykml.factory import GX_ElementMaker
-from diskcache import Cache
 
-
-##########################################################################
-
-def make_extended_data(values: dict):
-    """Creates a KML ExtendedData tag structure from the dict of given values."""
-    # FIXME: Return type???
-    ed = KML_ElementMaker.ExtendedData()
-    for k in values.keys():
-        d = KML_ElementMaker.Data(name=k)
-        v = KML_ElementMaker.value(values[k])
-        d.append(v)
-        ed.append(d)
-    return ed
+# Our own modules
+from metadata_store import MetadataStore, files_digest, parse_stored_date
+from coordinates import dms_to_decimal, check_coordinates, NULL_ISLAND, OFF_THE_MAP
+from output_formats import OUTPUT_FORMATS, format_for_file
+from clustering import Clusterer, MIN_PRECISION, MAX_PRECISION
+from tracks import Tracker, DEFAULT_TOLERANCE
+from places import Gazetteer
 
 
-def make_geo_timestamp(time: str, lat: str, lon: str):
-    """Creates a KML camera data time stamp with latitude and longitude."""
-    # FIXME: Return type???
-    return KML_ElementMaker.Camera(
-        GX_ElementMaker.TimeStamp(KML_ElementMaker.when(time)),
-        KML_ElementMaker.latitude(lat),
-        KML_ElementMaker.longitude(lon)
-    )
-
+##########################################################################
 
 def parse_exif_date(date: str) -> datetime.datetime | None:
     """Parses Exif datestamp string into a datetime structure.
@@ -66,6 +49,8 @@ def parse_exif_rational(frac: str) -> float:
     return a / b
 
 
+# The scoop itself converts coordinates in batches (see coordinates.py);
+# this is the one-file-at-a-time version, for coordinates given as strings.
 def parse_exif_coords(lat: str, lon: str, lat_ref: str, lon_ref: str) -> tuple[float, float]:
     """Parses Exif coordinates.
     
@@ -103,7 +88,7 @@ def parse_exif_coords(lat: str, lon: str, lat_ref: str, lon_ref: str) -> tuple[f
     if str(lat_ref) == 'S':
         lat_d = -lat_d
     # Sanity check.
-    if str(lat_ref) != 'N':
+    elif str(lat_ref) != 'N':
         raise ValueError(f"Latitude reference {str(lat_ref)} is neither N or S")
     # Convert longitude from degrees/minutes/seconds into a float.
     lon_d = float(lon_deg) + \
@@ -113,7 +98,7 @@ def parse_exif_coords(lat: str, lon: str, lat_ref: str, lon_ref: str) -> tuple[f
     if str(lon_ref) == 'W':
         lon_d = -lon_d
     # Sanity check.
-    if str(lon_ref) != 'E':
+    elif str(lon_ref) != 'E':
         raise ValueError(f"Longitude reference {str(lon_ref)} is neither W or E")
     # And we have our values now!
     return lat_d, lon_d
@@ -124,46 +109,299 @@ class SkippedFileException(Exception):
 
 
 # Read the image EXIF data
-def read_exif(file) -> tuple[datetime.datetime, float, float]:
-    global verbose_mode
+# This may run in a worker process, so instead of printing out why a file
+# was skipped, the reason is given in the exception.
+# The coordinates are given as they are in the Exif data: 12 integers and
+# the references (see coordinates.py). They're converted to decimal
+# coordinates later, a whole bunch of files at a time.
+def read_exif(file) -> tuple[datetime.datetime, tuple[int, ...], tuple[str, str]]:
     try:
         img = exiv2.ImageFactory.open(file)
     except exiv2.Exiv2Error:
-        if verbose_mode:
-            print(" - This file can't be read by Exiv2. Skipping.")
-        raise SkippedFileException
+        raise SkippedFileException("This file can't be read by Exiv2. Skipping.")
     img.readMetadata()
     data = img.exifData()
     #for k in data:
     #    print(k)
     date_raw = data["Exif.Photo.DateTimeOriginal"].getValue()
     if date_raw is None:
-        if verbose_mode:
-            print(" - No date found, skipping")
-        raise SkippedFileException
+        raise SkippedFileException("No date found, skipping")
     date = parse_exif_date(str(date_raw))
     if date is None:
-        if verbose_mode:
-            print(" - Date unparseable, skipping")
-        raise SkippedFileException
-    if verbose_mode:
-        print(f" - Date: {date}")
+        raise SkippedFileException("Date unparseable, skipping")
+
+    # Read the GPS coordinates: degrees, minutes and seconds as rationals.
+    # findKey() doesn't add an empty entry when the key isn't there.
+    rationals = []
+    for key in ('Exif.GPSInfo.GPSLatitude', 'Exif.GPSInfo.GPSLongitude'):
+        datum = data.findKey(exiv2.ExifKey(key))
+        if datum == data.end() or datum.count() != 3:
+            raise SkippedFileException("No coordinates found, skipping")
+        for i in range(3):
+            rationals.extend(datum.toRational(i))
+    refs = []
+    for key in ('Exif.GPSInfo.GPSLatitudeRef', 'Exif.GPSInfo.GPSLongitudeRef'):
+        datum = data.findKey(exiv2.ExifKey(key))
+        if datum == data.end():
+            raise SkippedFileException("No coordinates found, skipping")
+        refs.append(datum.toString().strip())
+
+    return date, tuple(rationals), tuple(refs)
+
+
+def read_exif_or_skip(file) -> tuple[datetime.datetime, tuple[int, ...], tuple[str, str]] | SkippedFileException:
+    """Same as read_exif(), but returns the SkippedFileException instead of
+    raising it, so that a worker process can hand it back to us."""
+    try:
+        return read_exif(file)
+    except SkippedFileException as e:
+        return e
 
-    # Read the GPS coordinates and convert them to KML style decimal coordinates
-    # FIXME later: ok, so value() works, but what the heck was up with getValue() above???
+
+def scan_directory(top: str, store: MetadataStore | None = None, skip_unchanged: bool = True):
+    """Walks the directory tree like os.walk() does, but gives the size and
+    modification time of each file straight from the directory listing.
+    Files and subfolders are gone through in alphabetical order.
+
+    With a `store`, each folder's rows are fetched from it as we go, and
+    the folder listings are recorded. If a folder hasn't changed since
+    it was last listed (same modification time, and the rows are still
+    the ones that were recorded), and `skip_unchanged` is set, it's not
+    listed again; its files and subfolders come from the store instead.
+
+    Yields (directory, [(name, size, mtime_ns), ...], rows), where rows
+    is what the store has for the folder (see MetadataStore.directory())."""
     try:
-        lat, lon, lat_ref, lon_ref = \
-            str(data['Exif.GPSInfo.GPSLatitude'].value()), \
-                str(data['Exif.GPSInfo.GPSLongitude'].value()), \
-                str(data['Exif.GPSInfo.GPSLatitudeRef'].value()), \
-                str(data['Exif.GPSInfo.GPSLongitudeRef'].value())
-        kml_lat, kml_lon = parse_exif_coords(lat, lon, lat_ref, lon_ref)
-    except exiv2.Exiv2Error:
+        mtime_ns = os.stat(top).st_mtime_ns
+    except OSError:
+        return
+    rows = {}
+    if store is not None:
+        rows = store.directory(top)
+        record = store.directory_record(top)
+        if skip_unchanged and record is not None and record[0] == mtime_ns:
+            _, entries, digest, subdirs = record
+            files = sorted((name, row[0], row[1]) for name, row in rows.items())
+            if entries == len(files) + len(subdirs) and digest == files_digest(files):
+                yield top, files, rows
+                for subdir in subdirs:
+                    yield from scan_directory(os.path.join(top, subdir), store, skip_unchanged)
+                return
+    try:
+        entries = sorted(os.scandir(top), key=lambda entry: entry.name)
+    except OSError:
+        return
+    files = []
+    subdirs = []
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif entry.is_file():
+                st = entry.stat()
+                files.append((entry.name, st.st_size, st.st_mtime_ns))
+        except OSError:
+            continue
+    if store is not None:
+        store.put_directory(top, mtime_ns, files, subdirs)
+    yield top, files, rows
+    for subdir in subdirs:
+        yield from scan_directory(os.path.join(top, subdir), store, skip_unchanged)
+
+
+def parse_query_date(date: str, end_of_day: bool = False) -> datetime.datetime:
+    """Parses a date given on the command line, e.g. 2025-06-01 or
+    2025-06-01T12:00. A plain date is the start of the day, or with
+    `end_of_day`, the very end of it."""
+    parsed = datetime.datetime.fromisoformat(date)
+    if end_of_day and len(date) <= len("2025-06-01"):
+        parsed += datetime.timedelta(days=1, microseconds=-1)
+    return parsed
+
+
+def wanted(date: datetime.datetime, lat: float, lon: float) -> bool:
+    """Whether the photo is within the dates and the area asked for."""
+    global since, until, bbox
+    if since is not None and date < since:
+        return False
+    if until is not None and date > until:
+        return False
+    if bbox is not None:
+        west, south, east, north = bbox
+        if not south <= lat <= north:
+            return False
+        # A box going over the antimeridian has west > east.
+        if west <= east and not west <= lon <= east:
+            return False
+        if west > east and not (lon >= west or lon <= east):
+            return False
+    return True
+
+
+# How many files go through the coordinate conversion at a time.
+CHUNK_SIZE = 1024
+
+
+def scoop_chunk(chunk: list, results, writer):
+    """Works out the coordinates for a chunk of files, and writes out the
+    ones that have them. `results` gives what read_exif_or_skip() got for
+    each of the files that weren't in the cache, in order."""
+    global caching, cache, verbose_mode, gazetteer
+
+    # First, see what we've got for each file. The messages are saved up
+    # so that they can be printed out in order once we're done.
+    messages = []
+    found = []
+    fresh = []
+    for fq_file, root, file, size, mtime_ns, cdata in chunk:
+        notes = [f"Processing {fq_file}"]
+        messages.append(notes)
+        found.append(None)
+        if cdata is not None:
+            # Cache is valid
+            # Retrieve cached values
+            notes.append(" - File unmodified, cached values used")
+            _, _, date, kml_lat, kml_lon = cdata
+            if date is None:
+                # Well there's no data for this then
+                notes.append(" - No coordinates found, skipping")
+            else:
+                found[-1] = (parse_stored_date(date), kml_lat, kml_lon)
+            continue
+        result = next(results)
+        if isinstance(result, SkippedFileException):
+            notes.append(f" - {result}")
+            if caching:
+                # If no sufficient data, save anyway
+                cache.put(root, file, size, mtime_ns, None, None, None)
+            # And off we go to the next file then
+            continue
+        notes.append(f" - Date: {result[0]}")
+        fresh.append((len(found) - 1, result))
+
+    # Convert the coordinates of the files we just read, all in one go.
+    lats, lons, valid = dms_to_decimal([raw for _, (_, raw, _) in fresh],
+                                       [refs for _, (_, _, refs) in fresh])
+    for (n, (date, _, _)), kml_lat, kml_lon, ok in zip(fresh, lats.tolist(), lons.tolist(), valid.tolist()):
+        _, root, file, size, mtime_ns, _ = chunk[n]
+        if ok:
+            found[n] = (date, kml_lat, kml_lon)
+        else:
+            messages[n].append(" - Coordinates can't be parsed, skipping")
+        if caching:
+            # OK, here's the regular data
+            if ok:
+                cache.put(root, file, size, mtime_ns, date, kml_lat, kml_lon)
+            else:
+                cache.put(root, file, size, mtime_ns, None, None, None)
+
+    # ...but wait! Did we somehow get pointed to the Null Island, or off
+    # the map altogether?
+    located = [n for n in range(len(found)) if found[n] is not None]
+    statuses = check_coordinates([found[n][1] for n in located], [found[n][2] for n in located])
+    for n, status in zip(located, statuses.tolist()):
+        _, kml_lat, kml_lon = found[n]
+        messages[n].append(f" - Coordinates: {kml_lat},{kml_lon}")
+        if status == NULL_ISLAND:
+            messages[n].append(" - Coordinates are probably bogus, skipping this one")
+            found[n] = None
+        elif status == OFF_THE_MAP:
+            messages[n].append(" - Coordinates are off the map, skipping this one")
+            found[n] = None
+        elif not wanted(*found[n]):
+            messages[n].append(" - Not within the dates or the area asked for, skipping")
+            found[n] = None
+
+    # Look up the place names of the ones that made it, all in one go.
+    places = [None] * len(found)
+    located = [n for n in located if found[n] is not None]
+    if gazetteer is not None and located:
+        names = gazetteer.lookup([found[n][1] for n in located], [found[n][2] for n in located])
+        for n, place in zip(located, names):
+            messages[n].append(f" - Place: {place}")
+            places[n] = place
+
+    # Right! With that out of the way, we can be reasonably sure we indeed have
+    # what we need: File name, date stamp, and coordinates.
+    for (fq_file, _, file, _, _, _), notes, data, place in zip(chunk, messages, found, places):
         if verbose_mode:
-            print(" - No coordinates found, skipping")
-        raise SkippedFileException
-
-    return date, kml_lat, kml_lon
+            print("\n".join(notes))
+        if data is not None:
+            # ...and put it on the file!
+            date, kml_lat, kml_lon = data
+            writer.add(file, fq_file, date, kml_lat, kml_lon, place=place)
+
+
+def walk_entries(top: str, store: MetadataStore | None, skip_unchanged: bool):
+    """Walks the input directory, giving each file as (fq_file, root, file,
+    size, mtime_ns, cdata), where cdata is what the cache has for it, or
+    None if it needs to be read. The cache is only ever touched here in
+    the main process, never in the workers, so they don't fight over it."""
+    # Folders that haven't changed since the last time don't even need to
+    # be listed, unless we're asked to look at every file anyway.
+    for root, files, cached in scan_directory(top, store, skip_unchanged):
+        for file, size, mtime_ns in files:
+            # Get the file's full name
+            fq_file = root + os.sep + file
+            # See if the cache has what we need. It does if the file
+            # hasn't changed since.
+            cdata = cached.pop(file, None)
+            if cdata is not None and (cdata[0], cdata[1]) != (size, mtime_ns):
+                cdata = None
+            yield fq_file, root, file, size, mtime_ns, cdata
+        # Whatever's left in the cache for this folder is gone now
+        if cached:
+            store.forget(root, cached.keys())
+
+
+def cached_entries(store: MetadataStore, top: str):
+    """Same as walk_entries(), but going by the cache alone: it's asked
+    for the photos under the input folder, with the dates and area asked
+    for, in the same order as walking the folders would give them."""
+    global since, until, bbox
+    rows = store.query(top, since, until, bbox)
+    rows.sort(key=lambda row: (row[0].split(os.sep), row[1]))
+    for root, file, size, mtime_ns, date, lat, lon in rows:
+        yield root + os.sep + file, root, file, size, mtime_ns, (size, mtime_ns, date, lat, lon)
+
+
+def chunked(entries, size: int = CHUNK_SIZE):
+    """Groups the entries into lists of `size`."""
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# How many chunks the worker processes may read ahead of the one being
+# written out.
+READ_AHEAD = 2
+
+
+def read_chunks(chunks, pool: ProcessPoolExecutor | None = None):
+    """Reads the exif data of the files in each chunk that weren't in the
+    cache, and gives back (chunk, results), as scoop_chunk() wants them.
+    With a pool, the next few chunks are already being read while one is
+    being written out; map() still hands the results back in the same
+    order as the files."""
+    global jobs
+    if pool is None:
+        for chunk in chunks:
+            yield chunk, map(read_exif_or_skip, [entry[0] for entry in chunk if entry[5] is None])
+        return
+    ahead = deque()
+    for chunk in chunks:
+        to_read = [entry[0] for entry in chunk if entry[5] is None]
+        chunk_size = max(1, min(64, len(to_read) // (jobs * 4)))
+        ahead.append((chunk, pool.map(read_exif_or_skip, to_read, chunksize=chunk_size)))
+        if len(ahead) > READ_AHEAD:
+            yield ahead.popleft()
+    while ahead:
+        yield ahead.popleft()
 
 
 ##########################################################################
@@ -175,146 +413,228 @@ def read_exif(file) -> tuple[datetime.datetime, float, float]:
 verbose_mode = False
 input_dir = "."
 output_file = "output.kml"
+output_format = None
 cache_file = None
 caching = False
 cache = None
+jobs = 1
+prune = False
+full_scan = False
+# Geohash precisions to cluster the photos at, coarsest first, or None
+cluster_levels = None
+# Write a track per day instead of the photos?
+tracks = False
+tolerance = DEFAULT_TOLERANCE
+# Gazetteer for place names, or None
+places_file = None
+gazetteer = None
+# Only the photos taken within these dates and this (west, south, east,
+# north) box, if given
+since = None
+until = None
+bbox = None
+# Go by the cache alone, without looking at the files?
+from_cache = False
 
 
 def parse_command_line():
-    global input_dir, output_file, cache_file, caching, verbose_mode
+    global input_dir, output_file, output_format, cache_file, caching, verbose_mode, jobs, prune, full_scan
+    global cluster_levels, tracks, tolerance, places_file, since, until, bbox, from_cache
     try:
-        opts, _ = getopt.getopt(sys.argv[1:], "i:o:c:v", ["input=", "output=", "cache=", "verbose"])
+        opts, _ = getopt.getopt(sys.argv[1:], "i:o:f:c:j:v",
+                                ["input=", "output=", "format=", "cache=", "jobs=", "prune", "full-scan",
+                                 "cluster=", "tracks", "tolerance=", "places=", "since=", "until=", "bbox=",
+                                 "from-cache", "verbose"])
     except getopt.GetoptError as err:
         print(err)
-        print("Usage: photo_geo_scooper [-i inputdir] [-o output.kml] [-v]")
+        print("Usage: photo_geo_scooper [-i inputdir] [-o output.kml] [-f format] [-c cache] [-j jobs] [-v]")
+        print("                         [--cluster precision[,precision...]] [--tracks [--tolerance metres]]")
+        print("                         [--places gazetteer]")
+        print("                         [--since date] [--until date] [--bbox west,south,east,north] [--from-cache]")
+        print("       photo_geo_scooper -c cache --prune")
         sys.exit(2)
     for o, a in opts:
         if o in ("-i", "--input"):
             input_dir = a
         elif o in ("-o", "--output"):
             output_file = a
+        elif o in ("-f", "--format"):
+            output_format = a.lower()
+            if output_format not in OUTPUT_FORMATS:
+                print(f"Unknown output format {a}, should be one of: {', '.join(OUTPUT_FORMATS.keys())}")
+                sys.exit(2)
         elif o in ("-c", "--cache"):
             cache_file = a
             caching = True
+        elif o in ("-j", "--jobs"):
+            try:
+                jobs = int(a)
+            except ValueError:
+                print(f"Number of jobs {a} isn't a number")
+                sys.exit(2)
+            # 0 means one per CPU core.
+            if jobs <= 0:
+                jobs = os.cpu_count() or 1
+        elif o == "--prune":
+            prune = True
+        elif o == "--full-scan":
+            full_scan = True
+        elif o == "--cluster":
+            try:
+                cluster_levels = sorted({int(level) for level in a.split(",")})
+            except ValueError:
+                print(f"Cluster precisions {a} should be numbers, separated by commas")
+                sys.exit(2)
+            if cluster_levels[0] < MIN_PRECISION or cluster_levels[-1] > MAX_PRECISION:
+                print(f"Cluster precisions should be from {MIN_PRECISION} to {MAX_PRECISION}")
+                sys.exit(2)
+        elif o == "--tracks":
+            tracks = True
+        elif o == "--tolerance":
+            try:
+                tolerance = float(a)
+            except ValueError:
+                print(f"Tolerance {a} isn't a number")
+                sys.exit(2)
+        elif o == "--places":
+            places_file = a
+            if not os.path.isfile(places_file):
+                print(f"Gazetteer {a} not found")
+                sys.exit(2)
+        elif o in ("--since", "--until"):
+            try:
+                if o == "--since":
+                    since = parse_query_date(a)
+                else:
+                    until = parse_query_date(a, end_of_day=True)
+            except ValueError:
+                print(f"Date {a} should be like 2025-06-01 or 2025-06-01T12:00")
+                sys.exit(2)
+        elif o == "--bbox":
+            try:
+                bbox = tuple(float(c) for c in a.split(","))
+            except ValueError:
+                bbox = ()
+            if (len(bbox) != 4 or not bbox[1] <= bbox[3]
+                    or not all(-180.0 <= c <= 180.0 for c in bbox[0::2])
+                    or not all(-90.0 <= c <= 90.0 for c in bbox[1::2])):
+                print(f"Bounding box {a} should be west,south,east,north in degrees")
+                sys.exit(2)
+        elif o == "--from-cache":
+            from_cache = True
         elif o == "-v":
             verbose_mode = True
+    # The cache goes by full paths, so the rows are the same folders
+    # whichever folder we're run from.
+    input_dir = os.path.abspath(input_dir)
+    if prune and not caching:
+        print("Nothing to prune without a cache")
+        sys.exit(2)
+    if from_cache and not caching:
+        print("Can't go by the cache without a cache")
+        sys.exit(2)
+    if from_cache and full_scan:
+        print("It's either from the cache or a full scan, not both")
+        sys.exit(2)
+    # If the format isn't given, go by the output file name.
+    if output_format is None:
+        output_format = format_for_file(output_file)
+    # Clusters need somewhere to put the level of detail.
+    if cluster_levels is not None and not hasattr(OUTPUT_FORMATS[output_format], "add_cluster"):
+        print(f"Clustering only works with formats: "
+              f"{', '.join(f for f, w in OUTPUT_FORMATS.items() if hasattr(w, 'add_cluster'))}")
+        sys.exit(2)
+    if tracks and not hasattr(OUTPUT_FORMATS[output_format], "add_track"):
+        print(f"Tracks only work with formats: "
+              f"{', '.join(f for f, w in OUTPUT_FORMATS.items() if hasattr(w, 'add_track'))}")
+        sys.exit(2)
+    if tracks and cluster_levels is not None:
+        print("It's either clusters or tracks, not both")
+        sys.exit(2)
+    # Place names go with the photos, and CSV has no column for them.
+    if places_file is not None and (tracks or cluster_levels is not None or output_format == "csv"):
+        print("Place names only go on photos, and not in CSV")
+        sys.exit(2)
 
 
 def main():
-    global input_dir, output_file, cache_file, caching, cache, verbose_mode
+    global input_dir, output_file, output_format, cache_file, caching, cache, verbose_mode, jobs, prune, full_scan
+    global cluster_levels, tracks, tolerance, places_file, gazetteer, since, until, bbox, from_cache
 
     # Parse command line
     parse_command_line()
 
+    # Just cleaning up the cache?
+    if prune:
+        cache = MetadataStore(cache_file)
+        removed = cache.prune()
+        cache.vacuum()
+        cache.close()
+        print(f"{removed} files no longer around, removed from cache")
+        return
+
     # Print out our settings.
     if verbose_mode:
         print(f"Input dir: {input_dir}")
         print(f"Output file: {output_file}")
+        print(f"Output format: {output_format}")
         if cache_file is not None:
             print(f"Cache location: {cache_file}")
         else:
             print("Caching disabled")
+        print(f"Jobs: {jobs}")
+        if cluster_levels is not None:
+            print(f"Cluster precisions: {', '.join(str(level) for level in cluster_levels)}")
+        if tracks:
+            print(f"Tracks, simplified to within {tolerance} m")
+        if places_file is not None:
+            print(f"Place names from: {places_file}")
+        if since is not None or until is not None:
+            print(f"Dates: {since or 'any'} to {until or 'any'}")
+        if bbox is not None:
+            print(f"Bounding box: {','.join(str(c) for c in bbox)}")
+        if from_cache:
+            print("Going by the cache alone")
 
     # Set up cache
     if caching:
-        cache = Cache(cache_file)
+        cache = MetadataStore(cache_file)
 
-    # New KML document
-    kml = KML_ElementMaker.kml(KML_ElementMaker.Document())
+    # The gazetteer's index is kept in the cache too, if there is one.
+    if places_file is not None:
+        gazetteer = Gazetteer.load(places_file, cache_file if caching else None)
 
-    # Walk the input directory
-    for root, dirs, files in os.walk(input_dir):
-        path = root.split(os.sep)
-        for file in files:
-            # Get the file's full name
-            fq_file = os.sep.join(path) + os.sep + file
-            # Skip non-files
-            if not os.path.isfile(fq_file):
-                continue
-            # OK, we're cool, continuing
-            if verbose_mode:
-                print(f"Processing {fq_file}")
-
-            # Get the file's last modified time
-            mtime = os.path.getmtime(fq_file)
-
-            # Read the exif data (via cache possibly)
-            if caching:
-                # Yes we do caching and yes this gets complicated
-                try:
-                    cdata = pickle.loads(cache[fq_file])
-                except KeyError:
-                    cdata = None
-                if cdata is None or mtime > cdata['mtime']:
-                    # Cache doesn't exist or is too old.
-                    # Come up with the new data and cache it.
-                    try:
-                        date, kml_lat, kml_lon = read_exif(fq_file)
-                    except SkippedFileException:
-                        # If no sufficient data, save anyway
-                        cdata = dict()
-                        cdata['mtime'] = mtime
-                        cdata['date'] = None
-                        cdata['kml_lat'] = None
-                        cdata['kml_lon'] = None
-                        cache[fq_file] = pickle.dumps(cdata)
-                        # And off we go to the next file then
-                        continue
-                    # OK, here's the regular data
-                    cdata = dict()
-                    cdata['mtime'] = mtime
-                    cdata['date'] = date
-                    cdata['kml_lat'] = kml_lat
-                    cdata['kml_lon'] = kml_lon
-                    cache[fq_file] = pickle.dumps(cdata)
-                else:
-                    # Cache is valid
-                    # Retrieve cached values
-                    if verbose_mode:
-                        print(" - File unmodified, cached values used")
-                    date = cdata['date']
-                    kml_lat = cdata['kml_lat']
-                    kml_lon = cdata['kml_lon']
-                    if date is None:
-                        # Well there's no data for this then
-                        if verbose_mode:
-                            print(" - No coordinates found, skipping")
-                        continue
+    # Read the exif data of the files that weren't in the cache. With more
+    # than one job, this happens in a pool of worker processes.
+    pool = None
+    if jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=jobs)
 
+    # The photos are written to the output file as we go. For clusters or
+    # tracks, they're collected up first, and written out at the end.
+    try:
+        with OUTPUT_FORMATS[output_format](output_file) as writer:
+            if cluster_levels is not None:
+                target = Clusterer(cluster_levels)
+            elif tracks:
+                target = Tracker(tolerance)
             else:
-                # No caching magic, just read the damn thing
-                try:
-                    date, kml_lat, kml_lon = read_exif(fq_file)
-                except SkippedFileException:
-                    continue
-
-            if verbose_mode:
-                print(f" - Coordinates: {kml_lat},{kml_lon}")
-            # ...but wait! Did we somehow get pointed to the Null Island?
-            if kml_lat == 0.0 and kml_lon == 0.0:
-                if verbose_mode:
-                    print(" - Coordinates are probably bogus, skipping this one")
-                continue
-            # Right! With that out of the way, we can be reasonably sure we indeed have
-            # what we need: File name, date stamp, and coordinates.
-
-            # Construct the KML data
-            ed = {
-                "Path": fq_file,
-                "Date": date.strftime("%Y-%m-%dT%H:%M:%S"),
-            }
-            place_mark = KML_ElementMaker.Placemark(
-                KML_ElementMaker.name(file),
-                make_geo_timestamp(date.strftime("%Y-%m-%dT%H:%M:%S"), kml_lat, kml_lon),
-                make_extended_data(ed)
-            )
-            # ...and put it on the file!
-            kml.Document.append(place_mark)
-
-    # Write the KML document to file.
-    f = open(output_file, "wb")
-    f.write(etree.tostring(kml, pretty_print=True))
-    f.close()
+                target = writer
+            # The folders are walked, the files read and the photos
+            # written a chunk at a time, so nothing piles up in memory.
+            if from_cache:
+                entries = cached_entries(cache, input_dir)
+            else:
+                entries = walk_entries(input_dir, cache, not full_scan)
+            for chunk, results in read_chunks(chunked(entries), pool):
+                scoop_chunk(chunk, results, target)
+            if target is not writer:
+                target.write(writer)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if caching:
+            cache.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,253 @@
+#!/usr/bin/python3
+##########################################################################
+# Photo Geo Scooper: Metadata store
+##########################################################################
+# (c) Rose Midford 2026
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+##########################################################################
+
+# Python builtins
+import os
+import json
+import sqlite3
+import hashlib
+import datetime
+
+##########################################################################
+
+# The database file inside the cache folder.
+DATABASE_NAME = "metadata.sqlite3"
+
+# Bump this when the tables (or what goes in them) change. A database
+# from any other version is thrown away and rebuilt, since it's just a
+# cache.
+SCHEMA_VERSION = 4
+
+# The files are indexed by date, and by where they were taken in an R*Tree
+# (files_where), which triggers keep up to date with the files table.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    date TEXT,
+    lat REAL,
+    lon REAL,
+    UNIQUE (dir, name)
+);
+
+CREATE INDEX IF NOT EXISTS files_date ON files (date);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS files_where USING rtree (
+    id, min_lat, max_lat, min_lon, max_lon
+);
+
+CREATE TRIGGER IF NOT EXISTS files_where_insert AFTER INSERT ON files
+WHEN new.lat IS NOT NULL BEGIN
+    INSERT INTO files_where VALUES (new.id, new.lat, new.lat, new.lon, new.lon);
+END;
+
+CREATE TRIGGER IF NOT EXISTS files_where_update AFTER UPDATE ON files BEGIN
+    DELETE FROM files_where WHERE id = old.id;
+    INSERT INTO files_where SELECT new.id, new.lat, new.lat, new.lon, new.lon
+        WHERE new.lat IS NOT NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS files_where_delete AFTER DELETE ON files BEGIN
+    DELETE FROM files_where WHERE id = old.id;
+END;
+
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    entries INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    subdirs TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class MetadataStore:
+    """Remembers the date and coordinates of each file, so that they only
+    need to be read again when the file changes (i.e. its size or
+    modification time is different).
+
+    The rows are kept by folder, by its full path, so that a whole
+    folder's worth of them can be fetched with one query. Writes are
+    collected and written `batch_size` at a time, each batch in one
+    transaction.
+
+    Folders are remembered too: their modification time, how many
+    entries they had, their subfolders, and a digest of the files in
+    them. If a folder's modification time hasn't changed, nothing has
+    been added, removed or renamed in it, so there's no need to list it
+    again."""
+
+    def __init__(self, location: str, batch_size: int = 1000):
+        os.makedirs(location, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(location, DATABASE_NAME))
+        self.batch_size = batch_size
+        self.pending = []
+        self.forgotten = []
+        self.pending_dirs = []
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self.db.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS files_where; "
+                                  "DROP TABLE IF EXISTS dirs;")
+        self.db.executescript(SCHEMA)
+        self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.db.commit()
+
+    def directory(self, directory: str) -> dict:
+        """Returns the rows for the files in the directory, as a dict of
+        name -> (size, mtime_ns, date, lat, lon)."""
+        rows = self.db.execute(
+            "SELECT name, size, mtime_ns, date, lat, lon FROM files WHERE dir = ?",
+            (directory,))
+        return {name: (size, mtime_ns, date, lat, lon)
+                for name, size, mtime_ns, date, lat, lon in rows}
+
+    def directory_record(self, directory: str) -> tuple | None:
+        """Returns what was known about the folder the last time it was
+        listed: (mtime_ns, entries, digest, subdirs), or None."""
+        row = self.db.execute(
+            "SELECT mtime_ns, entries, digest, subdirs FROM dirs WHERE path = ?",
+            (directory,)).fetchone()
+        if row is None:
+            return None
+        mtime_ns, entries, digest, subdirs = row
+        return mtime_ns, entries, digest, json.loads(subdirs)
+
+    def put_directory(self, directory: str, mtime_ns: int, files: list, subdirs: list):
+        """Stores what was found when listing the folder. `files` is a list
+        of (name, size, mtime_ns)."""
+        self.pending_dirs.append((directory, mtime_ns, len(files) + len(subdirs),
+                                  files_digest(files), json.dumps(subdirs)))
+        if len(self.pending_dirs) >= self.batch_size:
+            self.flush()
+
+    def put(self, directory: str, name: str, size: int, mtime_ns: int,
+            date: datetime.datetime | None, lat: float | None, lon: float | None):
+        """Stores the data for a file. Date is None if the file had no
+        usable date or coordinates."""
+        if date is not None:
+            date = date.isoformat()
+        self.pending.append((directory, name, size, mtime_ns, date, lat, lon))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def forget(self, directory: str, names):
+        """Removes the rows of the files that are no longer there."""
+        self.forgotten.extend((directory, name) for name in names)
+        if len(self.forgotten) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes out whatever has been stored, in one transaction."""
+        if not self.pending and not self.forgotten and not self.pending_dirs:
+            return
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?, ?)",
+                self.pending_dirs)
+            # An update rather than a replace, so that the triggers see it.
+            self.db.executemany(
+                "INSERT INTO files (dir, name, size, mtime_ns, date, lat, lon) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (dir, name) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                "date = excluded.date, lat = excluded.lat, lon = excluded.lon",
+                self.pending)
+            self.db.executemany(
+                "DELETE FROM files WHERE dir = ? AND name = ?",
+                self.forgotten)
+        self.pending = []
+        self.forgotten = []
+        self.pending_dirs = []
+
+    def query(self, top: str, since: datetime.datetime | None = None,
+              until: datetime.datetime | None = None, bbox: tuple | None = None) -> list:
+        """Returns the rows of the files in and under the folder `top` that
+        have a date and coordinates, as (dir, name, size, mtime_ns, date,
+        lat, lon), in no particular order. `since` and `until` (both
+        inclusive) narrow it down by date, and `bbox` (west, south, east,
+        north) by place; if west is more than east, the box goes over the
+        antimeridian. The R*Tree keeps its coordinates as 32-bit floats,
+        rounded outwards, so photos just outside the box may come along
+        too."""
+        self.flush()
+        # Everything under the folder sorts between "top/" and "top0",
+        # since "0" comes right after the separator.
+        prefix = top.rstrip(os.sep) + os.sep
+        sql = ("SELECT dir, name, size, mtime_ns, date, lat, lon FROM files "
+               "WHERE (dir IN (?, ?) OR (dir > ? AND dir < ?)) AND date IS NOT NULL")
+        params = [top, prefix[:-1] or os.sep, prefix, prefix[:-1] + chr(ord(os.sep) + 1)]
+        if since is not None:
+            sql += " AND date >= ?"
+            params.append(since.isoformat())
+        if until is not None:
+            sql += " AND date <= ?"
+            params.append(until.isoformat())
+        if bbox is not None:
+            west, south, east, north = bbox
+            sql += " AND id IN (SELECT id FROM files_where WHERE max_lat >= ? AND min_lat <= ?"
+            params += [south, north]
+            if west <= east:
+                sql += " AND max_lon >= ? AND min_lon <= ?)"
+            else:
+                sql += " AND (max_lon >= ? OR min_lon <= ?))"
+            params += [west, east]
+        return self.db.execute(sql, params).fetchall()
+
+    def prune(self) -> int:
+        """Removes the rows of files and folders that no longer exist,
+        anywhere. Each folder is only listed once. Returns the number of
+        files removed."""
+        self.flush()
+        removed = 0
+        gone_dirs = [(d,) for (d,) in self.db.execute("SELECT path FROM dirs")
+                     if not os.path.isdir(d)]
+        with self.db:
+            self.db.executemany("DELETE FROM dirs WHERE path = ?", gone_dirs)
+        directories = [d for (d,) in self.db.execute("SELECT DISTINCT dir FROM files")]
+        for directory in directories:
+            try:
+                present = set(os.listdir(directory))
+            except OSError:
+                present = set()
+            names = [name for (name,) in self.db.execute(
+                "SELECT name FROM files WHERE dir = ?", (directory,))]
+            gone = [name for name in names if name not in present]
+            self.forget(directory, gone)
+            removed += len(gone)
+        self.flush()
+        return removed
+
+    def vacuum(self):
+        """Shrinks the database file after pruning."""
+        self.flush()
+        self.db.execute("VACUUM")
+
+    def close(self):
+        self.flush()
+        # Keeps the statistics the query planner goes by up to date, so
+        # that query() picks the right index.
+        self.db.execute("PRAGMA optimize")
+        self.db.close()
+
+
+def files_digest(files) -> str:
+    """A digest of the names, sizes and modification times of the files,
+    given as (name, size, mtime_ns), in any order."""
+    digest = hashlib.blake2b(digest_size=16)
+    for name, size, mtime_ns in sorted(files):
+        digest.update(f"{name}\0{size}\0{mtime_ns}\0".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()
+
+
+def parse_stored_date(date: str | None) -> datetime.datetime | None:
+    """Turns a date from the store back into a datetime."""
+    if date is None:
+        return None
+    return datetime.datetime.fromisoformat(date)
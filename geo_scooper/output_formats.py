@@ -0,0 +1,398 @@
+#!/usr/bin/python3
+##########################################################################
+# Photo Geo Scooper: Output formats
+##########################################################################
+# (c) Rose Midford 2026
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+##########################################################################
+
+# Python builtins
+import os
+import csv
+import json
+import zipfile
+import datetime
+from abc import ABC, abstractmethod
+
+# PyPi packages
+from lxml import etree
+
+##########################################################################
+
+# All of the writers work the same way: they're used as context managers,
+# and add() writes out one photo right away, so nothing piles up in memory.
+# The place name, if there is one, is the nearest town or district.
+
+KML_NAMESPACE = "http://www.opengis.net/kml/2.2"
+GX_NAMESPACE = "http://www.google.com/kml/ext/2.2"
+ATOM_NAMESPACE = "http://www.w3.org/2005/Atom"
+GPX_NAMESPACE = "http://www.topografix.com/GPX/1/1"
+
+# Decimal places for coordinates in the compact formats. 7 places is
+# about a centimetre, which is way more than any camera GPS can do.
+COORDINATE_PRECISION = 7
+
+
+def kml(tag: str) -> str:
+    return f"{{{KML_NAMESPACE}}}{tag}"
+
+
+def gx(tag: str) -> str:
+    return f"{{{GX_NAMESPACE}}}{tag}"
+
+
+def gpx(tag: str) -> str:
+    return f"{{{GPX_NAMESPACE}}}{tag}"
+
+
+def format_date(date: datetime.datetime) -> str:
+    return date.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class XMLWriter(ABC):
+    """Base class for writing XML through lxml's xmlfile, one element at a
+    time. The output is indented the same way as lxml's pretty printer
+    would do it."""
+
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        self.file = None
+        self.xmlfile = None
+        self.xf = None
+        # Elements still open, innermost last.
+        self.elements = []
+
+    def open_file(self):
+        return open(self.output_file, "wb")
+
+    def close_file(self):
+        self.file.close()
+
+    @abstractmethod
+    def start(self):
+        """Opens the elements everything else goes in."""
+        pass
+
+    def __enter__(self):
+        self.file = self.open_file()
+        self.xmlfile = etree.xmlfile(self.file)
+        self.xf = self.xmlfile.__enter__()
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if exc[0] is None:
+                while self.elements:
+                    self.close()
+            self.xmlfile.__exit__(*exc)
+            if exc[0] is None:
+                self.file.write(b"\n")
+        finally:
+            self.close_file()
+        return False
+
+    def open(self, tag: str, **kwargs):
+        """Opens an element on a line of its own."""
+        if self.elements:
+            self.xf.write("\n" + "  " * len(self.elements))
+        element = self.xf.element(tag, **kwargs)
+        element.__enter__()
+        self.elements.append(element)
+
+    def close(self):
+        """Closes the innermost open element."""
+        element = self.elements.pop()
+        self.xf.write("\n" + "  " * len(self.elements))
+        element.__exit__(None, None, None)
+
+    def leaf(self, tag: str, text, **attrib):
+        """Writes an element with just text in it, on a line of its own."""
+        self.xf.write("\n" + "  " * len(self.elements))
+        with self.xf.element(tag, **attrib):
+            self.xf.write(str(text))
+
+
+class KMLWriter(XMLWriter):
+    """Writes a placemark for each photo to a KML file."""
+
+    def start(self):
+        self.open(kml("kml"), nsmap={None: KML_NAMESPACE, "atom": ATOM_NAMESPACE, "gx": GX_NAMESPACE})
+        self.open(kml("Document"))
+
+    def add(self, name: str, path: str, date: datetime.datetime, lat: float, lon: float,
+            place: str | None = None):
+        """Writes a placemark for one photo."""
+        when = format_date(date)
+        self.open(kml("Placemark"))
+        self.leaf(kml("name"), name)
+        # Camera data time stamp with latitude and longitude.
+        self.open(kml("Camera"))
+        self.open(gx("TimeStamp"))
+        self.leaf(kml("when"), when)
+        self.close()
+        self.leaf(kml("latitude"), lat)
+        self.leaf(kml("longitude"), lon)
+        self.close()
+        # Extended data
+        self.open(kml("ExtendedData"))
+        data = [("Path", path), ("Date", when)]
+        if place is not None:
+            data.append(("Place", place))
+        for key, value in data:
+            self.open(kml("Data"), name=key)
+            self.leaf(kml("value"), value)
+            self.close()
+        self.close()
+        self.close()
+
+    def open_folder(self, name: str):
+        """Opens a folder; close() closes it."""
+        self.open(kml("Folder"))
+        self.leaf(kml("name"), name)
+
+    def add_cluster(self, cluster, lod: tuple[int, int] | None = None):
+        """Writes a placemark for a cluster of photos. With `lod`, it gets
+        a Region covering the cluster's cell, with (minLodPixels,
+        maxLodPixels) as given."""
+        self.open(kml("Placemark"))
+        if cluster.count == 1:
+            self.leaf(kml("name"), cluster.name)
+        else:
+            self.leaf(kml("name"), f"{cluster.count} photos")
+        self.open(kml("TimeSpan"))
+        self.leaf(kml("begin"), format_date(cluster.first))
+        self.leaf(kml("end"), format_date(cluster.last))
+        self.close()
+        if lod is not None:
+            self.open(kml("Region"))
+            self.open(kml("LatLonAltBox"))
+            self.leaf(kml("north"), cluster.north)
+            self.leaf(kml("south"), cluster.south)
+            self.leaf(kml("east"), cluster.east)
+            self.leaf(kml("west"), cluster.west)
+            self.close()
+            self.open(kml("Lod"))
+            self.leaf(kml("minLodPixels"), lod[0])
+            self.leaf(kml("maxLodPixels"), lod[1])
+            self.close()
+            self.close()
+        # Extended data
+        data = [("Count", cluster.count), ("Geohash", cluster.geohash),
+                ("First", format_date(cluster.first)), ("Last", format_date(cluster.last))]
+        if cluster.path is not None:
+            data.append(("Path", cluster.path))
+        self.open(kml("ExtendedData"))
+        for key, value in data:
+            self.open(kml("Data"), name=key)
+            self.leaf(kml("value"), value)
+            self.close()
+        self.close()
+        self.open(kml("Point"))
+        self.leaf(kml("coordinates"), f"{cluster.lon},{cluster.lat}")
+        self.close()
+        self.close()
+
+    def add_track(self, track):
+        """Writes a day's track, as a gx:Track, so that each point keeps
+        its time."""
+        self.open(kml("Placemark"))
+        self.leaf(kml("name"), track.day.isoformat())
+        self.open(kml("TimeSpan"))
+        self.leaf(kml("begin"), format_date(track.times[0]))
+        self.leaf(kml("end"), format_date(track.times[-1]))
+        self.close()
+        self.open(kml("ExtendedData"))
+        for key, value in (("Photos", track.count), ("Points", len(track.times))):
+            self.open(kml("Data"), name=key)
+            self.leaf(kml("value"), value)
+            self.close()
+        self.close()
+        # All the times first, then all the coordinates.
+        self.open(gx("Track"))
+        for when in track.times:
+            self.leaf(kml("when"), format_date(when))
+        for lat, lon in zip(track.lats, track.lons):
+            self.leaf(gx("coord"), f"{lon} {lat} 0")
+        self.close()
+        self.close()
+
+
+class KMZWriter(KMLWriter):
+    """Same as KML, but zipped up, as Google Earth likes it. The KML goes
+    straight into the zip file, without a temporary file in between."""
+
+    def __init__(self, output_file: str):
+        super().__init__(output_file)
+        self.zip = None
+
+    def open_file(self):
+        self.zip = zipfile.ZipFile(self.output_file, "w", compression=zipfile.ZIP_DEFLATED)
+        return self.zip.open("doc.kml", "w")
+
+    def close_file(self):
+        try:
+            self.file.close()
+        finally:
+            self.zip.close()
+
+
+class GPXWriter(XMLWriter):
+    """Writes a GPX waypoint for each photo."""
+
+    def start(self):
+        self.open(gpx("gpx"), nsmap={None: GPX_NAMESPACE}, version="1.1", creator="Photo Geo Scooper")
+
+    def add(self, name: str, path: str, date: datetime.datetime, lat: float, lon: float,
+            place: str | None = None):
+        self.open(gpx("wpt"),
+                  lat=str(round(lat, COORDINATE_PRECISION)),
+                  lon=str(round(lon, COORDINATE_PRECISION)))
+        # The elements have to be in this order.
+        self.leaf(gpx("time"), format_date(date))
+        self.leaf(gpx("name"), name)
+        if place is not None:
+            self.leaf(gpx("cmt"), place)
+        self.leaf(gpx("desc"), path)
+        self.close()
+
+    def add_track(self, track):
+        """Writes a day's track, as a GPX track with one segment."""
+        self.open(gpx("trk"))
+        self.leaf(gpx("name"), track.day.isoformat())
+        self.open(gpx("trkseg"))
+        for when, lat, lon in zip(track.times, track.lats, track.lons):
+            self.open(gpx("trkpt"),
+                      lat=str(round(lat, COORDINATE_PRECISION)),
+                      lon=str(round(lon, COORDINATE_PRECISION)))
+            self.leaf(gpx("time"), format_date(when))
+            self.close()
+        self.close()
+        self.close()
+
+
+class GeoJSONWriter:
+    """Writes a GeoJSON point feature for each photo. Normally, that's one
+    big FeatureCollection; with `newline_delimited`, it's one feature per
+    line, which is easier on tools that read the features one at a time."""
+
+    def __init__(self, output_file: str, newline_delimited: bool = False):
+        self.output_file = output_file
+        self.newline_delimited = newline_delimited
+        self.file = None
+        self.first = True
+
+    def __enter__(self):
+        self.file = open(self.output_file, "w", encoding="utf-8", newline="\n")
+        if not self.newline_delimited:
+            self.file.write('{"type":"FeatureCollection","features":[')
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if exc[0] is None and not self.newline_delimited:
+                self.file.write("\n]}\n")
+        finally:
+            self.file.close()
+        return False
+
+    def add(self, name: str, path: str, date: datetime.datetime, lat: float, lon: float,
+            place: str | None = None):
+        feature = {
+            "type": "Feature",
+            # GeoJSON coordinates go longitude first.
+            "geometry": {"type": "Point", "coordinates": [round(lon, COORDINATE_PRECISION),
+                                                          round(lat, COORDINATE_PRECISION)]},
+            "properties": {"name": name, "path": path, "date": format_date(date)},
+        }
+        if place is not None:
+            feature["properties"]["place"] = place
+        self.write_feature(feature)
+
+    def add_track(self, track):
+        """Writes a day's track, as a LineString feature."""
+        feature = {
+            "type": "Feature",
+            "geometry": {"type": "LineString",
+                         "coordinates": [[round(lon, COORDINATE_PRECISION), round(lat, COORDINATE_PRECISION)]
+                                         for lat, lon in zip(track.lats, track.lons)]},
+            "properties": {"name": track.day.isoformat(), "photos": track.count,
+                           "begin": format_date(track.times[0]), "end": format_date(track.times[-1]),
+                           "times": [format_date(when) for when in track.times]},
+        }
+        self.write_feature(feature)
+
+    def write_feature(self, feature: dict):
+        line = json.dumps(feature, ensure_ascii=False, separators=(",", ":"))
+        if self.newline_delimited:
+            self.file.write(line + "\n")
+        else:
+            self.file.write(("\n" if self.first else ",\n") + line)
+        self.first = False
+
+
+class NDJSONWriter(GeoJSONWriter):
+    """GeoJSON, one feature per line."""
+
+    def __init__(self, output_file: str):
+        super().__init__(output_file, newline_delimited=True)
+
+
+class CSVWriter:
+    """Writes a CSV line for each photo, for spreadsheets and such."""
+
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        self.file = None
+        self.writer = None
+
+    def __enter__(self):
+        self.file = open(self.output_file, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["name", "path", "date", "lat", "lon"])
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+        return False
+
+    def add(self, name: str, path: str, date: datetime.datetime, lat: float, lon: float,
+            place: str | None = None):
+        # No place names, so that the columns stay the same.
+        self.writer.writerow([name, path, format_date(date),
+                              round(lat, COORDINATE_PRECISION),
+                              round(lon, COORDINATE_PRECISION)])
+
+
+##########################################################################
+
+# Format name -> writer class
+OUTPUT_FORMATS = {
+    "kml": KMLWriter,
+    "kmz": KMZWriter,
+    "gpx": GPXWriter,
+    "geojson": GeoJSONWriter,
+    "ndjson": NDJSONWriter,
+    "csv": CSVWriter,
+}
+
+# File name extension -> format name, for guessing the format.
+FORMAT_EXTENSIONS = {
+    ".kml": "kml",
+    ".kmz": "kmz",
+    ".gpx": "gpx",
+    ".geojson": "geojson",
+    ".json": "geojson",
+    ".ndjson": "ndjson",
+    ".geojsonl": "ndjson",
+    ".geojsons": "ndjson",
+    ".csv": "csv",
+}
+
+
+def format_for_file(output_file: str) -> str:
+    """Guesses the output format from the file name. KML if there's no
+    telling."""
+    _, extension = os.path.splitext(output_file)
+    return FORMAT_EXTENSIONS.get(extension.lower(), "kml")
@@ -0,0 +1,238 @@
+#!/usr/bin/python3
+##########################################################################
+# Photo Geo Scooper: Place names
+##########################################################################
+# (c) Rose Midford 2026
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+##########################################################################
+
+# Python builtins
+import os
+import io
+import csv
+import zipfile
+
+# PyPi packages
+import numpy as np
+
+##########################################################################
+
+# Place names come from a gazetteer in the GeoNames format: tab separated,
+# no header, with the name in the second column, latitude and longitude in
+# the fifth and sixth, the feature class in the seventh, and the country
+# code in the ninth. Only populated places (feature class P) are used,
+# which covers both cities and their districts. See
+# https://download.geonames.org/export/dump/ for the files; cities500.zip
+# or the file for a country are good choices.
+
+# The built index goes in the cache folder under this name.
+INDEX_NAME = "places.npz"
+
+# Bump this when the index changes.
+INDEX_VERSION = 1
+
+# How many places go in each leaf of the tree, at most.
+LEAF_SIZE = 32
+
+
+def unit_vectors(lat, lon) -> np.ndarray:
+    """Turns coordinates into points on a unit sphere. The straight line
+    distance between two points grows with the distance on the surface, so
+    the nearest point is the nearest place, even across the antimeridian."""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def read_gazetteer(path: str) -> tuple[list, list, list]:
+    """Reads the populated places from a GeoNames file, either as is or
+    zipped up. Returns the names, latitudes and longitudes."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            [member] = [n for n in archive.namelist() if n.endswith(".txt") and "readme" not in n.lower()]
+            with archive.open(member) as raw:
+                return parse_gazetteer(io.TextIOWrapper(raw, encoding="utf-8"))
+    with open(path, encoding="utf-8", newline="") as file:
+        return parse_gazetteer(file)
+
+
+def parse_gazetteer(file) -> tuple[list, list, list]:
+    names = []
+    lats = []
+    lons = []
+    for row in csv.reader(file, delimiter="\t", quoting=csv.QUOTE_NONE):
+        if len(row) < 9 or row[6] != "P":
+            continue
+        try:
+            lat, lon = float(row[4]), float(row[5])
+        except ValueError:
+            continue
+        names.append(row[1])
+        lats.append(lat)
+        lons.append(lon)
+    return names, lats, lons
+
+
+def build_tree(points: np.ndarray) -> dict:
+    """Builds a k-d tree: each node splits its points in half along the
+    axis they're most spread out on, until there's at most LEAF_SIZE of
+    them. The tree is kept in arrays, which is what gets cached. A child
+    that's a leaf is stored as ~leaf. Each node and leaf also gets the box
+    around its points, for skipping the ones that are too far away."""
+    order = np.arange(len(points))
+    dims = []
+    values = []
+    children = []
+    node_boxes = []
+    leaves = []
+
+    def split(start, end):
+        if end - start <= LEAF_SIZE:
+            leaves.append((start, end))
+            return ~(len(leaves) - 1)
+        chunk = points[order[start:end]]
+        low, high = chunk.min(axis=0), chunk.max(axis=0)
+        dim = int(np.argmax(high - low))
+        half = (end - start) // 2
+        part = np.argpartition(chunk[:, dim], half)
+        order[start:end] = order[start:end][part]
+        node = len(dims)
+        dims.append(dim)
+        values.append(float(points[order[start + half], dim]))
+        children.append([0, 0])
+        node_boxes.append((low, high))
+        # Everything left of the median is <= the split value.
+        left = split(start, start + half)
+        right = split(start + half, end)
+        children[node] = [left, right]
+        return node
+
+    root = split(0, len(points))
+    # Each leaf's places, padded out with -1, and the box around them.
+    leaf_places = np.full((len(leaves), LEAF_SIZE), -1, dtype=np.int64)
+    boxes = np.zeros((len(leaves), 2, 3), dtype=np.float64)
+    for n, (start, end) in enumerate(leaves):
+        leaf_places[n, :end - start] = order[start:end]
+        boxes[n, 0] = points[order[start:end]].min(axis=0)
+        boxes[n, 1] = points[order[start:end]].max(axis=0)
+    return {
+        "root": np.int64(root),
+        "dims": np.array(dims, dtype=np.int8),
+        "values": np.array(values, dtype=np.float64),
+        "children": np.array(children, dtype=np.int64).reshape(-1, 2),
+        "node_boxes": np.array(node_boxes, dtype=np.float64).reshape(-1, 2, 3),
+        "leaf_places": leaf_places,
+        "boxes": boxes,
+    }
+
+
+class Gazetteer:
+    """Looks up the nearest place for a bunch of coordinates at a time."""
+
+    def __init__(self, names: list, points: np.ndarray, tree: dict):
+        self.names = names
+        # One extra point, way off the sphere, for the padding in the leaves.
+        self.points = np.vstack([points, np.full((1, 3), 1e6)])
+        self.tree = tree
+
+    @classmethod
+    def load(cls, path: str, cache_dir: str | None = None) -> "Gazetteer":
+        """Reads the gazetteer. If there's a cache folder, the built tree is
+        kept there, and used as long as the gazetteer file hasn't changed."""
+        stat = os.stat(path)
+        source = f"{INDEX_VERSION}\0{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        index_file = None
+        if cache_dir is not None:
+            index_file = os.path.join(cache_dir, INDEX_NAME)
+            try:
+                with np.load(index_file) as index:
+                    if str(index["source"]) == source:
+                        names = bytes(index["names"]).decode("utf-8").split("\n")
+                        tree = {key: index[key] for key in index.files
+                                if key not in ("source", "names", "points")}
+                        return cls(names, index["points"], tree)
+            except (OSError, KeyError, ValueError):
+                pass
+
+        names, lats, lons = read_gazetteer(path)
+        if not names:
+            raise ValueError(f"No populated places in {path}")
+        points = unit_vectors(lats, lons)
+        tree = build_tree(points)
+        if index_file is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write it under another name first, so that a half-written
+            # index never gets used.
+            temp_file = index_file + ".tmp"
+            with open(temp_file, "wb") as file:
+                np.savez(file, source=np.str_(source), points=points,
+                         names=np.frombuffer("\n".join(names).encode("utf-8"), dtype=np.uint8),
+                         **tree)
+            os.replace(temp_file, index_file)
+        return cls(names, points, tree)
+
+    def nearest(self, lat, lon) -> np.ndarray:
+        """Returns the index of the nearest place for each of the
+        coordinates. All of them go down the tree together."""
+        tree = self.tree
+        dims, values, children = tree["dims"], tree["values"], tree["children"]
+        queries = unit_vectors(lat, lon).reshape(-1, 3)
+        count = len(queries)
+
+        # First, go straight down to the leaf each photo falls in, and
+        # find the nearest place in there. That's a good first guess.
+        node = np.full(count, int(tree["root"]), dtype=np.int64)
+        inside = node >= 0
+        while inside.any():
+            at = node[inside]
+            right = queries[inside, dims[at]] > values[at]
+            node[inside] = children[at, right.astype(np.int64)]
+            inside = node >= 0
+        best_place = np.zeros(count, dtype=np.int64)
+        best_distance = np.full(count, np.inf)
+        self.search_leaves(queries, np.arange(count), ~node, best_place, best_distance)
+
+        # Then go down again, this time into every branch whose box is
+        # closer than the best found so far, as the nearest place could
+        # be just over the edge. The first leaf has been done already.
+        first_leaf = ~node
+        query = np.arange(count)
+        node = np.full(count, int(tree["root"]), dtype=np.int64)
+        while len(query):
+            leaf = node < 0
+            boxes = np.empty((len(query), 2, 3))
+            boxes[leaf] = tree["boxes"][~node[leaf]]
+            boxes[~leaf] = tree["node_boxes"][node[~leaf]]
+            gap = np.maximum(np.maximum(boxes[:, 0] - queries[query], queries[query] - boxes[:, 1]), 0.0)
+            near = (gap ** 2).sum(axis=1) < best_distance[query]
+            check = leaf & near & (~node != first_leaf[query])
+            self.search_leaves(queries, query[check], ~node[check], best_place, best_distance)
+            branch = ~leaf & near
+            query = np.repeat(query[branch], 2)
+            node = children[node[branch]].reshape(-1)
+        return best_place
+
+    def search_leaves(self, queries, query, leaf, best_place, best_distance):
+        """Checks the places in the given leaves against the given photos,
+        and keeps the best for each photo."""
+        if not len(query):
+            return
+        places = self.tree["leaf_places"][leaf]
+        distance = ((self.points[places] - queries[query, None, :]) ** 2).sum(axis=-1)
+        nearest = distance.argmin(axis=1)
+        rows = np.arange(len(query))
+        distance = distance[rows, nearest]
+        places = places[rows, nearest]
+        # Closest first, so that the first of each photo is the winner.
+        order = np.lexsort((distance, query))
+        query, first = np.unique(query[order], return_index=True)
+        distance = distance[order][first]
+        better = distance < best_distance[query]
+        best_distance[query[better]] = distance[better]
+        best_place[query[better]] = places[order][first][better]
+
+    def lookup(self, lat, lon) -> list[str]:
+        """Returns the name of the nearest place for each of the
+        coordinates."""
+        return [self.names[n] for n in self.nearest(lat, lon).tolist()]
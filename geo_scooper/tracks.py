@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+##########################################################################
+# Photo Geo Scooper: Tracks
+##########################################################################
+# (c) Rose Midford 2026
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+##########################################################################
+
+# Python builtins
+import math
+import datetime
+import itertools
+from dataclasses import dataclass
+
+# PyPi packages
+import numpy as np
+
+##########################################################################
+
+# The photos of each day make a track, in the order they were taken.
+# Points that hardly change the shape of the track are dropped with the
+# Douglas-Peucker algorithm: a point is kept only if it's further than
+# the tolerance away from the line between the points kept around it.
+
+# Default tolerance, in metres.
+DEFAULT_TOLERANCE = 10.0
+
+# Metres per degree of latitude (or of longitude at the equator), going by
+# the mean radius of the Earth.
+METRES_PER_DEGREE = 6371008.8 * math.pi / 180
+
+
+@dataclass
+class Track:
+    """The photos of one day, as a line."""
+    day: datetime.date
+    # How many photos the day had, before simplifying
+    count: int
+    # What's left of them after simplifying, in order
+    times: list[datetime.datetime]
+    lats: list[float]
+    lons: list[float]
+
+
+def simplify(lat, lon, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker simplification of a line, with the tolerance in
+    metres. Returns which of the points to keep. The distances are worked
+    out on a flat map centred on the line, which is close enough for a
+    day's worth of walking."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    keep = np.zeros(len(lat), dtype=bool)
+    if len(lat) == 0:
+        return keep
+    keep[0] = keep[-1] = True
+    if tolerance <= 0:
+        keep[:] = True
+        return keep
+    y = (lat - lat.mean()) * METRES_PER_DEGREE
+    x = (lon - lon.mean()) * METRES_PER_DEGREE * math.cos(math.radians(lat.mean()))
+
+    # No recursion, since a day can have thousands of points.
+    stack = [(0, len(lat) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        # Distance to the segment rather than the whole line, since a walk
+        # often comes back to where it started.
+        length = dx * dx + dy * dy
+        if length > 0:
+            t = np.clip((px * dx + py * dy) / length, 0.0, 1.0)
+        else:
+            t = 0.0
+        distance = np.hypot(px - t * dx, py - t * dy)
+        furthest = int(np.argmax(distance))
+        if distance[furthest] > tolerance:
+            furthest += first + 1
+            keep[furthest] = True
+            stack.append((first, furthest))
+            stack.append((furthest, last))
+    return keep
+
+
+class Tracker:
+    """Collects the photos instead of writing them out, and then writes out
+    a track for each day. Has the same add() as the output writers, so it
+    can take a writer's place."""
+
+    def __init__(self, tolerance: float = DEFAULT_TOLERANCE):
+        self.tolerance = tolerance
+        self.points = []
+
+    def add(self, name: str, path: str, date: datetime.datetime, lat: float, lon: float,
+            place: str | None = None):
+        self.points.append((date, lat, lon))
+
+    def tracks(self) -> list[Track]:
+        """Sorts the photos by date, and makes a track of each day. A day
+        with just the one photo doesn't make a line, so it's left out."""
+        self.points.sort(key=lambda point: point[0])
+        tracks = []
+        for day, points in itertools.groupby(self.points, key=lambda point: point[0].date()):
+            points = list(points)
+            if len(points) < 2:
+                continue
+            times, lats, lons = zip(*points)
+            keep = simplify(lats, lons, self.tolerance)
+            tracks.append(Track(day=day, count=len(points),
+                                times=list(itertools.compress(times, keep)),
+                                lats=list(itertools.compress(lats, keep)),
+                                lons=list(itertools.compress(lons, keep))))
+        return tracks
+
+    def write(self, writer):
+        for track in self.tracks():
+            writer.add_track(track)
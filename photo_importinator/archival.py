@@ -7,47 +7,63 @@
 # for the full license terms.
 
 import os
+import contextlib
 from pathlib import Path
 import logging
 from zipfile import ZipFile
 
-import py7zr
 from dazzle import *
 from rich import print
 from rich.progress import Progress, SpinnerColumn, FileSizeColumn, TotalFileSizeColumn
 from configuration import Configuration
+from instrumentation import span
 
 logger = logging.getLogger(__name__)
 
 ###### Creating backup archives ##########################################
 
-def archive(source:Path, target:Path):
-    """Archive all files under `source` to 7-Zip file `target`.
+def backup_progress_bar():
+    """The progress bar for backups."""
+    return progress_bar(
+        SpinnerColumn(),
+        *Progress.get_default_columns(),
+        ' | ',
+        FileSizeColumn(),
+        '/',
+        TotalFileSizeColumn()
+    )
+
+def archive(source:Path, target:Path, bar:Progress=None):
+    """Archive all files under `source` to 7-Zip file `target`. If several
+    backups are running at once, they share the progress bar `bar`.
 
     TODO: This should probably be a bit more elegant. Yet, since this
     part of the process can't really be made parallel, expressing these
     as photo_processing.Task isn't really feasible. So this is
     really just a helper function at this point.
     """
+    # Imported here, since py7zr and its compression libraries take their
+    # time to load and only backups need them.
+    import py7zr
     backup_source_files = enumerate_source(source)
     total_size = total_source_size(backup_source_files)
     logger.info(f"Backing up {source} to {target}.")
-    with py7zr.SevenZipFile(target, 'w') as output_archive, \
-        Progress(
-            SpinnerColumn(),
-            *Progress.get_default_columns(),
-            ' | ',
-            FileSizeColumn(),
-            '/',
-            TotalFileSizeColumn()
-        ) as bar:
-        bar_task = bar.add_task("[yellow]Backing up...", total=total_size)
+    if bar is None:
+        bar_context = backup_progress_bar()
+        description = "[yellow]Backing up..."
+    else:
+        bar_context = contextlib.nullcontext(bar)
+        description = f"[yellow]Backing up to {target.name}..."
+    with py7zr.SevenZipFile(target, 'w') as output_archive, bar_context as bar:
+        bar_task = bar.add_task(description, total=total_size)
         for file, size in backup_source_files:
             rel_file = file.relative_to(source)
-            logger.info(f"Backing up: {rel_file}")
+            logger.info(f"Backing up: {rel_file}",extra={'bytes': size})
             logger.debug(f"Full path {file}, size {size} bytes")
-            print(f"Backing up: {rel_file}")
-            output_archive.write(file, rel_file)
+            with span('console'):
+                backup_msg(rel_file,size)
+            with span('archive_write'):
+                output_archive.write(file, rel_file)
             bar.update(bar_task,advance=size)
     arc_size = os.path.getsize(target)
     ratio = (arc_size / total_size) * 100
@@ -95,7 +111,7 @@ def unpack_all(configuration:Configuration):
                 die("7-zip files unpacking is unimplemented")
             print(f"Unarchive file: {file}")
             with (ZipFile(file,'r') as archive_file,
-                  Progress(SpinnerColumn(),*Progress.get_default_columns()) as bar):
+                  progress_bar(SpinnerColumn(),*Progress.get_default_columns()) as bar):
                 bar_task = bar.add_task("[white]Unpacking...",
                                         total=len(archive_file.filelist))
                 for entry in archive_file.filelist:
@@ -110,11 +126,11 @@ def unpack_all(configuration:Configuration):
                         continue
                     if not configuration.dry_run:
                         archive_file.extract(entry, source)
-                        print(f":white_check_mark-emoji: Extracted {out_path}")
+                        extract_msg(out_path)
                         logger.debug(f"Unpacked {out_path}")
                         total_count = total_count + 1
                     else:
-                        print(f":cross_mark_button-emoji: [yellow]Skipped: {out_path}[/yellow] (Dry run)")
+                        skip_warn(f"[yellow]Skipped: {out_path}[/yellow] (Dry run)")
                         logger.debug(f"Dry run: would have unpacked {out_path}")
                     bar.update(bar_task,advance=1)
             if not (configuration.leave_originals or configuration.dry_run):
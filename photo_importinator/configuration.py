@@ -16,7 +16,6 @@ from dataclasses import dataclass
 import logging
 from rich import print
 from dazzle import *
-from deprecated import deprecated
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +33,13 @@ def logfile_path() -> Path:
         return Path(os.environ['PHOTO_IMPORTINATOR_LOGFILE'])
     return Path.home() / 'photo_importinator.log'
 
+def profile_path(suffix:str) -> Path:
+    """Get the location of a profiler output file. Profiler output is stored
+    next to the log file (see `logfile_path()`), named after the log file
+    with the given suffix, e.g. `photo_importinator.prof`."""
+    log = logfile_path()
+    return log.parent / (log.stem + suffix)
+
 @dataclass
 class Configuration:
     """Photo Importinator's configuration."""
@@ -46,6 +52,20 @@ class Configuration:
         PURGE_RUNNING_STATS = 4
         SCAN = 5
         UNPACK = 6
+        EMBED = 7
+        WATCH = 8
+
+    class QueueOrder(str, Enum):
+        """The order in which the import queue is run."""
+        WALK = 'walk'                   # As the files were found
+        LARGEST_FIRST = 'largest-first'
+        RATED_FIRST = 'rated-first'     # Highest rated first
+        NEWEST_FIRST = 'newest-first'   # By capture time
+
+    class MetadataMode(str, Enum):
+        """Where the metadata carried over to converted files goes."""
+        EMBED = 'embed'                 # Into the file itself
+        SIDECAR = 'sidecar'             # Into an XMP sidecar file
 
     action: Action = None
     __config: dict = None
@@ -59,6 +79,9 @@ class Configuration:
     dry_run: bool = False
     leave_originals: bool = False
     overwrite_target: bool = False
+    queue_order: QueueOrder = QueueOrder.WALK
+    queue_lanes: bool = False
+    queue_streaming: bool = False
     camera: str = None
     source_path: Path = None
     target_path: Path = None
@@ -68,6 +91,10 @@ class Configuration:
     backup_path: Path = None
     dnglab_path: Path = None
     dnglab_flags: list = None
+    carry_over: list[str] = None
+    metadata_mode: MetadataMode = MetadataMode.EMBED
+    conversion_cache_path: Path = None
+    conversion_cache_max_size: int = 20 * 1024**3
     report_output_file: Path = None
 
     def is_valid_config(self) -> bool:
@@ -211,6 +238,31 @@ class Configuration:
             self.dnglab_flags = self.__config['Conversion']['convert_flags']
         except KeyError:
             self.dnglab_flags = None
+        # Metadata to carry over to converted files
+        try:
+            self.carry_over = self.__config['Conversion']['carry_over']
+        except KeyError:
+            self.carry_over = ['Xmp.xmp.Rating', 'Xmp.xmp.Label', 'Xmp.dc.subject']
+        try:
+            self.metadata_mode = Configuration.MetadataMode(self.__config['Conversion']['metadata_mode'])
+        except KeyError:
+            self.metadata_mode = Configuration.MetadataMode.EMBED
+        except ValueError:
+            logger.error(f"Unknown metadata_mode {self.__config['Conversion']['metadata_mode']}")
+            die(f"Unknown metadata_mode {self.__config['Conversion']['metadata_mode']} in the configuration file, use 'embed' or 'sidecar'.")
+        self.parse_conversion_cache()
+
+    def parse_conversion_cache(self):
+        """Parses the conversion cache settings. The cache is only used
+        if `cache_path` is set."""
+        try:
+            self.conversion_cache_path = Path(self.__config['Conversion']['cache_path'])
+        except KeyError:
+            self.conversion_cache_path = None
+        try:
+            self.conversion_cache_max_size = int(self.__config['Conversion']['cache_max_size_gb'] * 1024**3)
+        except KeyError:
+            pass
 
     def __find_source_path_card(self):
         """Find source path for a card source."""
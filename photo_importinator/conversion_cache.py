@@ -0,0 +1,159 @@
+#!/usr/bin/python
+##########################################################################
+# Photo Importinator III: This Time It's Python For Some Reason
+##########################################################################
+# (c) 2026 Rose Midford.
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+
+import os
+import shutil
+import hashlib
+import threading
+import functools
+import subprocess
+from pathlib import Path
+import logging
+
+from archival import human_size
+
+logger = logging.getLogger(__name__)
+
+###### dnglab version ####################################################
+
+@functools.lru_cache(maxsize=8)
+def dnglab_version(dnglab_path:Path) -> str:
+    """Returns the version string dnglab reports, or None if it can't be
+    figured out."""
+    try:
+        result = subprocess.run([dnglab_path,'--version'],capture_output=True,check=True,text=True)
+    except (OSError, subprocess.CalledProcessError) as error:
+        logger.warning(f"Can't get dnglab version: {error}")
+        return None
+    return result.stdout.strip()
+
+###### Conversion cache ##################################################
+
+class ConversionCache:
+    """Keeps the DNG files dnglab produced, so that converting the same
+    raw file again (when importing to another target, or after a failed
+    run) is just a copy.
+
+    The files are keyed by the contents of the raw file, the dnglab version
+    and the conversion flags, so a new dnglab version or different flags
+    mean a fresh conversion. When the cache grows over `max_size` bytes,
+    the least recently used files are thrown out."""
+
+    def __init__(self,directory:Path,max_size:int):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Total size of the cache, figured out when first needed.
+        self._size:int = None
+
+    def key(self,source:Path,dnglab_path:Path,flags:tuple) -> str:
+        """Returns the cache key for converting `source`, or None if the
+        file can't be cached (i.e. dnglab version is unknown)."""
+        version = dnglab_version(dnglab_path)
+        if version is None:
+            return None
+        digest = hashlib.sha256()
+        with open(source,'rb') as f:
+            while chunk := f.read(1024*1024):
+                digest.update(chunk)
+        digest.update(b'\0' + version.encode())
+        for flag in (flags or ()):
+            digest.update(b'\0' + str(flag).encode())
+        return digest.hexdigest()
+
+    def _path_for(self,key:str) -> Path:
+        return self.directory / key[:2] / f"{key}.dng"
+
+    def fetch(self,key:str,target:Path) -> bool:
+        """Copies the cached DNG for `key` to `target`. Returns False if
+        there is no such file in the cache, or it can't be copied, in which
+        case it's converted as usual."""
+        cached = self._path_for(key)
+        try:
+            shutil.copyfile(cached,target)
+        except OSError as error:
+            if not isinstance(error,FileNotFoundError):
+                logger.warning(f"Can't fetch {cached} from the conversion cache: {error}")
+            # Don't leave a half-copied file in dnglab's way.
+            try:
+                target.unlink(missing_ok=True)
+            except OSError:
+                pass
+            with self._lock:
+                self.misses += 1
+            return False
+        # Mark as recently used. (Unless it was evicted in the meantime.)
+        try:
+            os.utime(cached)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        logger.debug(f"Conversion cache hit: {cached}")
+        return True
+
+    def store(self,key:str,dng:Path):
+        """Puts a freshly converted DNG in the cache."""
+        cached = self._path_for(key)
+        cached.parent.mkdir(parents=True,exist_ok=True)
+        # Copy to a temporary name first, so that an interrupted copy
+        # doesn't leave a broken file in the cache.
+        temporary = cached.with_suffix(f".{threading.get_ident()}.tmp")
+        # If the file was in the cache already, it's replaced, not added.
+        try:
+            replaced = cached.stat().st_size
+        except OSError:
+            replaced = 0
+        try:
+            shutil.copyfile(dng,temporary)
+            os.replace(temporary,cached)
+        except OSError as error:
+            logger.warning(f"Can't store {dng} in the conversion cache: {error}")
+            temporary.unlink(missing_ok=True)
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._total_size()
+            else:
+                self._size += cached.stat().st_size - replaced
+            if self._size > self.max_size:
+                self._evict()
+
+    def _files(self) -> list:
+        return [f for f in self.directory.glob('*/*.dng') if f.is_file()]
+
+    def _total_size(self) -> int:
+        return sum(f.stat().st_size for f in self._files())
+
+    def _evict(self):
+        """Throw out the least recently used files until the cache is
+        comfortably (10%) below the maximum size."""
+        files = sorted(((f.stat().st_mtime, f.stat().st_size, f) for f in self._files()),
+                       key=lambda entry: entry[0])
+        self._size = sum(size for _, size, _ in files)
+        goal = self.max_size * 0.9
+        evicted = 0
+        for _, size, f in files:
+            if self._size <= goal:
+                break
+            try:
+                f.unlink()
+            except OSError:
+                continue
+            self._size -= size
+            evicted += 1
+        logger.info(f"Conversion cache: {evicted} files evicted, {human_size(self._size)} left")
+
+    def purge(self):
+        """Empty the cache."""
+        if self.directory.exists():
+            for f in self._files():
+                f.unlink()
+        self._size = 0
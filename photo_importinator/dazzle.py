@@ -7,6 +7,8 @@
 # for the full license terms.
 
 import sys
+import time
+from collections import deque
 from rich import print
 from rich.console import Console
 from rich.panel import Panel
@@ -14,6 +16,11 @@ from rich.text import Text
 
 console = Console()
 
+# In quiet mode, the per-file messages aren't printed (they still go to the
+# log). Instead, they're tallied in `summary`, which is shown above the
+# progress bar. Use set_quiet() to change this.
+quiet = False
+
 def endazzle_terminal():
     """Initialise terminal window so that it can accept "fancy" output."""
     # Not really needed much these days. If rich needs more initialisation stuff,
@@ -33,10 +40,16 @@ def success(message:str):
 def skip_warn(message:str):
     """Prints a skip warning message.
     It is preceded by a skip icon emoji and displayed in bold."""
+    if quiet:
+        summary.count('Skipped')
+        return
     print(f":cross_mark_button-emoji:  [bright_white]{message}[/bright_white]")
 def warn(message:str):
     """Prints a warning message.
     It is preceded by an warning emoji and displayed in yellow."""
+    if quiet:
+        summary.error(message)
+        return
     print(f":warning-emoji:  [yellow]{message}[/yellow]")
 def die(message:str,errcode:int=1):
     """Prints an error message and exits with specified error code.
@@ -45,7 +58,102 @@ def die(message:str,errcode:int=1):
     print(f":warning-emoji:  [bright_red]{message}[/bright_red]")
     sys.exit(errcode)
 
-def move_msg(source:str,destination:str):
+def move_msg(source:str,destination:str,size:int=None):
+    if quiet:
+        summary.count('Moved',size)
+        return
     print(f"{source} :right_arrow:  {destination}")
-def convert_msg(source:str,destination:str):
+def convert_msg(source:str,destination:str,size:int=None):
+    if quiet:
+        summary.count('Converted',size)
+        return
     print(f"[:gear-emoji:  [bright_green]Convert[/bright_green]] {source} :right_arrow: {destination}")
+def backup_msg(file:str,size:int=None):
+    if quiet:
+        summary.count('Backed up',size)
+        return
+    print(f"Backing up: {file}")
+def extract_msg(file:str):
+    if quiet:
+        summary.count('Extracted')
+        return
+    print(f":white_check_mark-emoji: Extracted {file}")
+
+###### Quiet mode ########################################################
+
+class ConsoleSummary:
+    """Running tally of the per-file messages that quiet mode doesn't print.
+    Rendered as a panel with counts, throughput and the most recent errors."""
+
+    def __init__(self,recent_errors:int=5):
+        self.counts:dict = {}
+        self.bytes:int = 0
+        self.errors:int = 0
+        self.recent_errors:deque = deque(maxlen=recent_errors)
+        self.start_time:float = time.monotonic()
+        # Files and bytes counted before start_time, left out of the
+        # throughput.
+        self.files_before:int = 0
+        self.bytes_before:int = 0
+
+    def count(self,kind:str,size:int=None):
+        self.counts[kind] = self.counts.get(kind,0) + 1
+        if size is not None:
+            self.bytes += size
+
+    def error(self,message:str):
+        self.errors += 1
+        self.recent_errors.append(message)
+
+    def restart_clock(self):
+        """Count the throughput from now on, rather than from when the
+        summary was made (which is before the confirmation prompt)."""
+        self.start_time = time.monotonic()
+        self.files_before = sum(self.counts.values())
+        self.bytes_before = self.bytes
+
+    def __rich__(self) -> Panel:
+        from rich.table import Table
+        elapsed = max(time.monotonic() - self.start_time, 0.001)
+        files = sum(self.counts.values()) - self.files_before
+        size = self.bytes - self.bytes_before
+        grid = Table.grid(padding=(0,2))
+        grid.add_column(style='bright_white',no_wrap=True)
+        grid.add_column(style='white')
+        for kind, n in self.counts.items():
+            grid.add_row(kind, str(n))
+        rate = f"{files/elapsed:.1f} files/s"
+        if size > 0:
+            rate += f", {size/elapsed/(1024*1024):.1f} MiB/s"
+        grid.add_row('Throughput', rate)
+        if self.errors > 0:
+            grid.add_row('[yellow]Warnings[/yellow]', str(self.errors))
+            for message in self.recent_errors:
+                grid.add_row('', f"[yellow]{message}[/yellow]")
+        return Panel(grid,title='Summary',border_style='cyan')
+
+summary = ConsoleSummary()
+
+def set_quiet(enabled:bool=True):
+    """Turn quiet mode on or off. Starts a fresh summary."""
+    global quiet, summary
+    quiet = enabled
+    summary = ConsoleSummary()
+
+def restart_summary_clock():
+    """Count the summary's throughput from now on."""
+    summary.restart_clock()
+
+def progress_bar(*columns):
+    """Returns a Rich progress bar with the given columns. In quiet mode, the
+    summary panel is shown along with it, redrawn a couple of times a second."""
+    # Imported here to keep rich.progress out of the startup path.
+    from rich.progress import Progress
+    if not quiet:
+        return Progress(*columns)
+    class SummaryProgress(Progress):
+        """Progress bar with the quiet mode summary panel on top."""
+        def get_renderables(self):
+            yield summary
+            yield from super().get_renderables()
+    return SummaryProgress(*columns,refresh_per_second=2)
@@ -0,0 +1,166 @@
+#!/usr/bin/python
+##########################################################################
+# Photo Importinator III: This Time It's Python For Some Reason
+##########################################################################
+# (c) 2026 Rose Midford.
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+
+import sys
+import time
+import threading
+import cProfile
+from enum import Enum
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable
+import logging
+
+logger = logging.getLogger(__name__)
+
+###### Profiler selection ################################################
+
+class ProfileMode(str, Enum):
+    """The profiler to wrap the command in. All of the modes also collect
+    span timings (see `span()`)."""
+    CPROFILE = 'cprofile'
+    SAMPLE = 'sample'
+    SPANS = 'spans'
+
+###### Span tracing ######################################################
+
+# Span tracing is off unless profiling was requested. Keep span() cheap
+# when it's off, since it's called for every file.
+_spans_enabled:bool = False
+# Span name -> [count, total seconds, longest single span in seconds]
+_span_totals:dict = {}
+_span_lock = threading.Lock()
+
+@contextmanager
+def span(name:str):
+    """Time the enclosed block and add it to the totals for `name`.
+    Does nothing unless span tracing is enabled."""
+    if not _spans_enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _span_lock:
+            totals = _span_totals.get(name)
+            if totals is None:
+                _span_totals[name] = [1, elapsed, elapsed]
+            else:
+                totals[0] += 1
+                totals[1] += elapsed
+                if elapsed > totals[2]:
+                    totals[2] = elapsed
+
+def write_span_report(output:Path):
+    """Write the collected span totals to `output` as a tab-separated
+    table, the most time-consuming spans first."""
+    with _span_lock:
+        rows = sorted(_span_totals.items(), key=lambda x: x[1][1], reverse=True)
+    with open(output,'w',encoding='utf-8') as f:
+        f.write("span\tcount\ttotal_s\tmean_ms\tmax_ms\n")
+        for name, (count, total, longest) in rows:
+            f.write(f"{name}\t{count}\t{total:.6f}\t{(total/count)*1000:.3f}\t{longest*1000:.3f}\n")
+
+###### Sampling profiler #################################################
+
+class SamplingProfiler:
+    """A simple statistical profiler. A background thread takes a snapshot
+    of every other thread's call stack every `interval` seconds. The result
+    is written in the "collapsed stack" format understood by flame graph
+    tools (e.g. speedscope, flamegraph.pl).
+
+    Unlike cProfile, this won't slow down the profiled code noticeably, and
+    time spent waiting on I/O or child processes shows up too."""
+
+    def __init__(self,interval:float=0.005):
+        self.interval = interval
+        self.samples:dict = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample_loop,
+                                        name='SamplingProfiler',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                    frame = frame.f_back
+                if stack:
+                    key = ';'.join(reversed(stack))
+                    self.samples[key] = self.samples.get(key, 0) + 1
+
+    def write(self,output:Path):
+        with open(output,'w',encoding='utf-8') as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+
+###### Starting and stopping #############################################
+
+_mode:ProfileMode = None
+_profiler = None
+
+def start_profiling(mode:ProfileMode):
+    """Enable span tracing and start the profiler for the given mode."""
+    global _mode, _profiler, _spans_enabled
+    _mode = mode
+    _spans_enabled = True
+    match mode:
+        case ProfileMode.CPROFILE:
+            _profiler = cProfile.Profile()
+            _profiler.enable()
+        case ProfileMode.SAMPLE:
+            _profiler = SamplingProfiler()
+            _profiler.start()
+        case ProfileMode.SPANS:
+            _profiler = None
+    logger.info(f"Profiling enabled ({mode.value})")
+
+def stop_profiling(output_path:Callable[[str],Path]) -> list[Path]:
+    """Stop profiling and write the results. `output_path` maps a file
+    suffix to the output file (normally `configuration.profile_path`).
+    Returns the list of files written."""
+    global _profiler, _spans_enabled
+    if _mode is None:
+        return []
+    written = []
+    match _mode:
+        case ProfileMode.CPROFILE:
+            _profiler.disable()
+            # Readable with `python -m pstats` or snakeviz.
+            output = output_path('.prof')
+            _profiler.dump_stats(output)
+            written.append(output)
+        case ProfileMode.SAMPLE:
+            _profiler.stop()
+            output = output_path('.samples.txt')
+            _profiler.write(output)
+            written.append(output)
+    _profiler = None
+    _spans_enabled = False
+    output = output_path('.spans.tsv')
+    write_span_report(output)
+    written.append(output)
+    for output in written:
+        logger.info(f"Profiling results written to {output}")
+    return written
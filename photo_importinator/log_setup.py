@@ -0,0 +1,97 @@
+#!/usr/bin/python
+##########################################################################
+# Photo Importinator III: This Time It's Python For Some Reason
+##########################################################################
+# (c) 2026 Rose Midford.
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+
+import os
+import copy
+import json
+import queue
+import atexit
+import datetime
+import logging
+import logging.handlers
+from pathlib import Path
+
+###### Log formats #######################################################
+
+# Attributes every LogRecord has. Anything else was passed in with `extra`.
+_standard_attributes = set(logging.makeLogRecord({}).__dict__.keys()) | {'message', 'asctime'}
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats log records as JSON, one object per line. Fields passed to
+    the logger with `extra` (e.g. task_id, bytes, duration) are included
+    as they are, so the log can be analysed without regex scraping."""
+
+    def format(self, record:logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _standard_attributes:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def log_format() -> str:
+    """Get the log file format: `text` (the default) or `json`. Like the log
+    location, this is needed before the command line is parsed, so it is
+    set with the environment variable `PHOTO_IMPORTINATOR_LOG_FORMAT`."""
+    return os.environ.get('PHOTO_IMPORTINATOR_LOG_FORMAT', 'text').lower()
+
+###### Background logging ################################################
+
+_listener:logging.handlers.QueueListener = None
+_file_handler:logging.Handler = None
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that leaves the exception and the `extra` fields for
+    the file handler's formatter to deal with. The stock one bakes the
+    traceback into the message and drops exc_info, so that the record can
+    be pickled, but this queue never leaves the process."""
+
+    def prepare(self, record:logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        # The traceback is turned into text right away, rather than keeping
+        # its frames alive until the listener gets round to it.
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+def start_logging(filename:Path, level:int):
+    """Start logging to `filename`. Log records are put in a queue and written
+    to the file by a background thread, so slow disks (or a log file on a
+    network drive) don't hold up the import itself."""
+    global _listener, _file_handler
+    _file_handler = logging.FileHandler(filename, encoding='utf-8')
+    if log_format() == 'json':
+        _file_handler.setFormatter(JsonLinesFormatter())
+    else:
+        _file_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, _file_handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Write out whatever is still in the queue and close the log file."""
+    global _listener, _file_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    _file_handler.close()
+    _file_handler = None
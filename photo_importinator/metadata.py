@@ -0,0 +1,277 @@
+#!/usr/bin/python
+##########################################################################
+# Photo Importinator III: This Time It's Python For Some Reason
+##########################################################################
+# (c) 2026 Rose Midford.
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+
+import os
+import queue
+import datetime
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import exiv2
+from rich import print
+from rich.progress import Progress, SpinnerColumn
+
+from dazzle import warn, skip_warn, progress_bar, print_boxed_text
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+###### Reading ###########################################################
+
+@dataclass
+class SourceMetadata:
+    """Metadata read from a source image while populating the queue."""
+    date:datetime.datetime = None
+    rating:int = 0
+    # Metadata to carry over to the converted file: key -> exiv2 value.
+    carry_over:dict = None
+
+def _find(img:exiv2.Image, key:str):
+    """Returns the metadata container the key belongs to and the position
+    of the key in it (or end(), if it's not there). Uses findKey(), since
+    plain indexing would add an empty entry for a missing key."""
+    if key.startswith('Xmp.'):
+        data = img.xmpData()
+        return data, data.findKey(exiv2.XmpKey(key))
+    elif key.startswith('Iptc.'):
+        data = img.iptcData()
+        return data, data.findKey(exiv2.IptcKey(key))
+    else:
+        data = img.exifData()
+        return data, data.findKey(exiv2.ExifKey(key))
+
+def read_metadata(file:Path, carry_over:tuple=()) -> SourceMetadata:
+    """Reads the metadata we need from the specified image file, in one go:
+    the date, the rating, and the values of the `carry_over` keys.
+    For the date, will try to grab the original date from EXIF, or failing
+    that, file modification time. Returns None if the file can't be read."""
+    mtime = datetime.datetime.fromtimestamp(os.path.getmtime(file))
+    try:
+        img = exiv2.ImageFactory.open(str(file))
+    except exiv2.Exiv2Error:
+        return None
+    img.readMetadata()
+    data, entry = _find(img, "Exif.Photo.DateTimeOriginal")
+    if entry == data.end():
+        date = mtime
+    else:
+        try:
+            date = datetime.datetime.strptime(entry.toString(),'%Y:%m:%d %H:%M:%S')
+        except ValueError:
+            date = mtime
+    data, entry = _find(img, "Xmp.xmp.Rating")
+    rating = 0
+    if entry != data.end():
+        try:
+            rating = int(entry.toInt64())
+        except (exiv2.Exiv2Error, ValueError):
+            rating = 0
+    values = {}
+    for key in carry_over:
+        # No point in writing a zero rating.
+        if key == "Xmp.xmp.Rating" and rating == 0:
+            continue
+        try:
+            data, entry = _find(img, key)
+        except exiv2.Exiv2Error:
+            logger.warning(f"Unknown metadata key {key}, not carried over.")
+            continue
+        if entry != data.end() and entry.count() > 0:
+            values[key] = entry.getValue()
+    return SourceMetadata(date=date,rating=rating,carry_over=values or None)
+
+###### Writing ###########################################################
+
+def write_metadata(file:Path, values:dict) -> bool:
+    """Writes the metadata values (key -> exiv2 value) to the file, opening
+    and rewriting it just once. Returns True if it went well."""
+    try:
+        img = exiv2.ImageFactory.open(str(file))
+        img.readMetadata()
+        for key, value in values.items():
+            if key.startswith('Xmp.'):
+                img.xmpData()[key] = value
+            elif key.startswith('Iptc.'):
+                img.iptcData()[key] = value
+            else:
+                img.exifData()[key] = value
+        img.writeMetadata()
+    except exiv2.Exiv2Error as error:
+        logger.error(f"Writing metadata to {file} failed: {error}")
+        return False
+    logger.info(f"Metadata carried over to {file}: {', '.join(values.keys())}")
+    return True
+
+###### Sidecars ##########################################################
+
+def sidecar_path_for(file:Path) -> Path:
+    """Returns the XMP sidecar path for the file. The suffix is added to
+    the full name (IMG_0001.DNG.xmp), so that a JPEG and a DNG of the same
+    photo don't end up sharing a sidecar."""
+    return file.with_name(file.name + '.xmp')
+
+def write_sidecar(file:Path, values:dict) -> bool:
+    """Writes the metadata values to an XMP sidecar next to the file,
+    instead of rewriting the (possibly big) file itself. Sidecars can only
+    hold XMP, so any other keys still go to the file. Returns True if it
+    went well."""
+    others = {key: value for key, value in values.items() if not key.startswith('Xmp.')}
+    if others and not write_metadata(file, others):
+        return False
+    xmp_values = {key: value for key, value in values.items() if key.startswith('Xmp.')}
+    if not xmp_values:
+        return True
+    sidecar = sidecar_path_for(file)
+    try:
+        if sidecar.exists():
+            img = exiv2.ImageFactory.open(str(sidecar))
+            img.readMetadata()
+        else:
+            img = exiv2.ImageFactory.create(exiv2.ImageType.xmp, str(sidecar))
+        for key, value in xmp_values.items():
+            img.xmpData()[key] = value
+        img.writeMetadata()
+    except exiv2.Exiv2Error as error:
+        logger.error(f"Writing sidecar {sidecar} failed: {error}")
+        return False
+    logger.info(f"Metadata written to sidecar {sidecar}: {', '.join(xmp_values.keys())}")
+    return True
+
+def find_sidecars(directory:Path):
+    """Yields the XMP sidecars in the directory and its subdirectories
+    that have the file they belong to next to them."""
+    for root, dirs, files in os.walk(directory):
+        root = Path(root)
+        for file in files:
+            if not file.lower().endswith('.xmp'):
+                continue
+            sidecar = root / file
+            if sidecar.with_suffix('').is_file():
+                yield sidecar
+
+def embed_sidecar(sidecar:Path, keep_sidecar:bool=False) -> bool:
+    """Writes the contents of the sidecar into the file it belongs to, and
+    removes the sidecar (unless asked to keep it). Returns True if the
+    metadata made it to the file."""
+    file = sidecar.with_suffix('')
+    try:
+        img = exiv2.ImageFactory.open(str(sidecar))
+        img.readMetadata()
+    except exiv2.Exiv2Error as error:
+        logger.error(f"Reading sidecar {sidecar} failed: {error}")
+        return False
+    values = {datum.key(): datum.getValue() for datum in img.xmpData()}
+    if values and not write_metadata(file, values):
+        return False
+    if not keep_sidecar:
+        # The metadata is in the file already, so this isn't a failure,
+        # but the sidecar will be embedded again next time.
+        try:
+            sidecar.unlink()
+        except OSError as error:
+            logger.warning(f"Can't remove sidecar {sidecar}: {error}")
+            warn(f"Embedded {sidecar}, but couldn't remove it.")
+    return True
+
+def embed_all(directory:Path, keep_sidecars:bool=False, dry_run:bool=False, jobs:int=4):
+    """Embed all of the sidecars in the directory into their files, `jobs`
+    files at a time."""
+    print_boxed_text("EMBED")
+    print(f" - Folder: {directory}")
+    if dry_run:
+        print(" - Dry run")
+    if keep_sidecars:
+        print(" - Keep sidecars")
+    print()
+    sidecars = list(find_sidecars(directory))
+    logger.info(f"Embed: {len(sidecars)} sidecars found in {directory}")
+    if dry_run:
+        for sidecar in sidecars:
+            skip_warn(f"Would embed {sidecar} into {sidecar.with_suffix('')}")
+        return
+    embedded = 0
+    failed = 0
+    with (ThreadPoolExecutor(max_workers=jobs,thread_name_prefix='Embed') as pool,
+          progress_bar(SpinnerColumn(),*Progress.get_default_columns()) as bar):
+        bar_task = bar.add_task("[white]Embedding...",total=len(sidecars))
+        for sidecar, ok in zip(sidecars, pool.map(lambda s: embed_sidecar(s, keep_sidecars), sidecars)):
+            if ok:
+                embedded += 1
+            else:
+                failed += 1
+                warn(f"Embedding {sidecar} failed.")
+            bar.update(bar_task,advance=1)
+    print(f"{embedded} sidecars embedded, {failed} failed.")
+    logger.info(f"Embed: {embedded} sidecars embedded, {failed} failed")
+
+###### Post-conversion stage #############################################
+
+class MetadataWriter:
+    """The post-conversion stage: writes the carried over metadata to the
+    converted files in a background thread, so that the conversions don't
+    have to wait for it. Whatever has piled up is written in one batch, and
+    if the same file shows up more than once in a batch, the values are
+    merged, so each file is only opened and rewritten once. With
+    `sidecars`, the metadata goes to XMP sidecars instead."""
+
+    _END = object()
+
+    def __init__(self, sidecars:bool=False):
+        self.sidecars = sidecars
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.SimpleQueue()
+        self._thread:threading.Thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, file:Path, values:dict):
+        """Queue the metadata to be written to `file`."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,name='MetadataWriter',daemon=True)
+                self._thread.start()
+        self._queue.put((file, values))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get())
+            pending:dict = {}
+            done = False
+            for item in batch:
+                if item is MetadataWriter._END:
+                    done = True
+                    continue
+                file, values = item
+                pending.setdefault(file, {}).update(values)
+            for file, values in pending.items():
+                with span('metadata_write'):
+                    if self.sidecars:
+                        ok = write_sidecar(file, values)
+                    else:
+                        ok = write_metadata(file, values)
+                if ok:
+                    self.written += 1
+                else:
+                    self.failed += 1
+                    warn(f"Carrying metadata over to {file} failed.")
+            if done:
+                return
+
+    def finish(self):
+        """Wait until everything queued has been written."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None:
+            return
+        self._queue.put(MetadataWriter._END)
+        thread.join()
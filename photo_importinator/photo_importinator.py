@@ -7,15 +7,21 @@
 # for the full license terms.
 
 import os, sys, time, datetime
+import copy
+from concurrent.futures import ThreadPoolExecutor
 from typing import Annotated
 import typer
 from pathlib import Path
-from configuration import Configuration, logfile_path
+from configuration import Configuration, logfile_path, profile_path
 from running_stats import RunningStats
+from instrumentation import ProfileMode, start_profiling, stop_profiling
+from log_setup import start_logging, stop_logging
 from dazzle import *
 from rich import print
-from rich.table import Table
-from photo_processing import *
+
+# NOTE: The heavier modules (photo_processing, archival, and through them
+# exiv2 and py7zr) are imported in the commands that actually need them,
+# so that commands like `list` and `stats` start up quickly.
 
 import logging
 logger = logging.getLogger(__name__)
@@ -25,6 +31,8 @@ logger = logging.getLogger(__name__)
 # Useful values: logging.INFO or logging.DEBUG
 log_level = logging.INFO
 delete_old_log = True
+# The log format is set with the PHOTO_IMPORTINATOR_LOG_FORMAT environment
+# variable: 'text' (default) or 'json' (JSON lines). See log_setup.py.
 
 ###### APPLICATION ######################################################
 
@@ -35,12 +43,93 @@ app = typer.Typer(name="photo_importinator",
                   no_args_is_help=True)
 config = Configuration()
 
+@app.callback()
+def global_options(
+    ctx: typer.Context,
+    profile:
+        Annotated[ProfileMode,
+            typer.Option("--profile",
+                help="Profile the command. Results are written next to the log file.")]
+            = None,
+    quiet:
+        Annotated[bool,
+            typer.Option("--quiet","-q",
+                help="Show a summary instead of a line for every file. (Files are still logged.)")]
+            = False):
+    if quiet:
+        set_quiet()
+    if profile is not None:
+        start_profiling(profile)
+        ctx.call_on_close(report_profiling)
+
+def report_profiling():
+    """Stop the profiler and tell where the results went."""
+    for output in stop_profiling(profile_path):
+        print(f"Profiling results written to {output}")
+
+def print_settings(configuration:Configuration,extra_flags:list=None):
+    """Prints out the relevant settings for an import."""
+    from rich.table import Table
+    table = Table(title='Settings',show_header=False,show_edge=False)
+    table.add_column('',style='bright_white',no_wrap=True)
+    table.add_column('', style='white')
+    # Settings file section
+    table.add_section()
+    table.add_row('Settings file',str(configuration.configuration_file))
+    # Settings section
+    table.add_section()
+    table.add_row('Camera',configuration.camera)
+    if configuration.is_cloud_source():
+        table.add_row('Cloud drive', f":cloud-emoji:  {configuration.card}")
+    else:
+        table.add_row('Card',configuration.card)
+    table.add_row('Backup folder',str(configuration.backup_path))
+    table.add_row('Destination', str(configuration.date_to_path_demo()))
+    flags = []
+    if configuration.dry_run:
+        flags.append("Dry run.")
+    if configuration.skip_backup:
+        flags.append("Skipping backup.")
+    if configuration.skip_import:
+        flags.append("Skipping import.")
+    if configuration.leave_originals:
+        flags.append("Leaving original files.")
+    if configuration.overwrite_target:
+        flags.append("Overwriting existing target files.")
+    if configuration.queue_order != Configuration.QueueOrder.WALK:
+        flags.append(f"Import order: {configuration.queue_order.value}.")
+    if configuration.queue_lanes:
+        flags.append("Large files in a separate lane.")
+    if configuration.queue_streaming:
+        flags.append("Streaming: importing while scanning.")
+    if configuration.metadata_mode == Configuration.MetadataMode.SIDECAR:
+        flags.append("Metadata to XMP sidecars.")
+    if extra_flags is not None:
+        flags.extend(extra_flags)
+    if len(flags) > 0:
+        flags_txt = ''
+        for f in flags:
+            flags_txt += f"- {f}\n"
+        flags_txt = flags_txt.rstrip()
+        table.add_section()
+        table.add_row('Flags:',flags_txt)
+    print(table)
+
+def ask_confirmation(cancel_message:str):
+    """Waits for the user to confirm the settings, or exits."""
+    try:
+        print("If information isn't correct, press Ctrl+C to abort.")
+        input("Press Return to continue: ")
+    except KeyboardInterrupt:
+        print(f"\n{cancel_message}")
+        sys.exit(0)
+
 @app.command(name="import",
-             help="Import from the specified camera.")
+             help="Import from the specified camera(s).")
 def command_import(
-    camera:
-        Annotated[str,
-            typer.Argument(help="Camera name.")],
+    cameras:
+        Annotated[list[str],
+            typer.Argument(help="Camera name(s). Several cameras are imported at once.")],
     configuration_file:
         Annotated[Path,
             typer.Option("--configuration-file","-C",
@@ -79,6 +168,18 @@ def command_import(
     overwrite_target:
         Annotated[bool,
             typer.Option(help="If target files exist, overwrite them instead of skipping.")]
+            = False,
+    order:
+        Annotated[Configuration.QueueOrder,
+            typer.Option(help="Order in which the files are imported.")]
+            = Configuration.QueueOrder.WALK,
+    lanes:
+        Annotated[bool,
+            typer.Option(help="Import large files (e.g. videos) alongside a separate lane of small files.")]
+            = False,
+    stream:
+        Annotated[bool,
+            typer.Option(help="Start importing right away, while the source is still being scanned.")]
             = False):
     # Configuration
     config.action = Configuration.Action.IMPORT
@@ -91,70 +192,66 @@ def command_import(
     config.dry_run = dry_run
     config.leave_originals = leave_originals
     config.overwrite_target = overwrite_target
-    config.camera = camera
-    logger.info('ACTION: Import')
+    config.queue_order = order
+    config.queue_lanes = lanes
+    config.queue_streaming = stream
+    logger.info(f"ACTION: Import from {', '.join(cameras)}")
+    if config.queue_streaming and config.queue_order != Configuration.QueueOrder.WALK:
+        # Sorting needs the whole list of files up front.
+        warn(f"Import order {config.queue_order.value} can't be used when streaming, ignoring.")
+        config.queue_order = Configuration.QueueOrder.WALK
+    if card is not None and len(cameras) > 1:
+        logger.error("Import: --card given with several cameras")
+        die("--card can only be used when importing from one camera.")
     config.read_configuration()
-    config.parse_configuration()
-    config.find_source_path()
-    config.validate()
+    # Each camera gets its own copy of the configuration.
+    sources = []
+    for camera in cameras:
+        source = copy.copy(config)
+        source.camera = camera
+        source.parse_configuration()
+        source.find_source_path()
+        source.validate()
+        sources.append(source)
+    if len(set(source.source_path for source in sources)) < len(sources):
+        logger.error("Import: same source given twice")
+        die("The same card or cloud drive is given more than once.")
     # Time for action
+    from photo_processing import BackupTask, ImportQueue
+    from archival import backup_progress_bar
 
     start_time = time.time()
 
     # Print the banner and relevant settings
     print_boxed_text("PHOTO IMPORTINATOR")
 
-    table = Table(title='Settings',show_header=False,show_edge=False)
-    table.add_column('',style='bright_white',no_wrap=True)
-    table.add_column('', style='white')
-    # Settings file section
-    table.add_section()
-    table.add_row('Settings file',str(config.configuration_file))
-    # Settings section
-    table.add_section()
-    table.add_row('Camera',config.camera)
-    if config.is_cloud_source():
-        table.add_row('Cloud drive', f":cloud-emoji:  {config.card}")
-    else:
-        table.add_row('Card',config.card)
-    table.add_row('Backup folder',str(config.backup_path))
-    table.add_row('Destination', str(config.date_to_path_demo()))
-    flags = []
-    if config.dry_run:
-        flags.append("Dry run.")
-    if config.skip_backup:
-        flags.append("Skipping backup.")
-    if config.skip_import:
-        flags.append("Skipping import.")
-    if config.leave_originals:
-        flags.append("Leaving original files.")
-    if config.overwrite_target:
-        flags.append("Overwriting existing target files.")
-    if len(flags) > 0:
-        flags_txt = ''
-        for f in flags:
-            flags_txt += f"- {f}\n"
-        flags_txt = flags_txt.rstrip()
-        table.add_section()
-        table.add_row('Flags:',flags_txt)
-    print(table)
+    for source in sources:
+        print_settings(source)
+    ask_confirmation("Import cancelled.")
 
-    # Wait for user confirmation
-    try:
-        print("If information isn't correct, press Ctrl+C to abort.")
-        input("Press Return to continue: ")
-    except KeyboardInterrupt:
-        print("\nImport cancelled.")
-        sys.exit(0)
-
-    # Create and run the backup task.
-    backup_task = BackupTask(config)
-    backup_task.execute()
+    # Create and run the backup tasks. Several backups are run at once,
+    # each into its own archive.
+    if len(sources) == 1:
+        BackupTask(sources[0]).execute()
+    else:
+        with (backup_progress_bar() as bar,
+              ThreadPoolExecutor(max_workers=len(sources),thread_name_prefix='Backup') as pool):
+            backup_tasks = [BackupTask(source,bar) for source in sources]
+            if len(set(task.target for task in backup_tasks)) < len(backup_tasks):
+                logger.error("Import: backup archive names collide")
+                die("Two backups would go to the same archive file.")
+            for future in [pool.submit(task.execute) for task in backup_tasks]:
+                future.result()
 
-    # Create and run the import queue.
-    queue = ImportQueue(config)
-    queue.populate()
-    queue.run()
+    # Create and run the import queue, with all of the cameras in it.
+    queue = ImportQueue(sources[0])
+    for source in sources[1:]:
+        queue.add_source(source)
+    if config.queue_streaming:
+        queue.run_streaming()
+    else:
+        queue.populate()
+        queue.run()
 
     # Print out some final stats.
     queue.print_status()
@@ -167,6 +264,89 @@ def command_import(
 
     sys.exit(0)
 
+@app.command(name="watch",
+             help="Keep importing new photos from the specified cloud camera as they come in.")
+def command_watch(
+    camera:
+        Annotated[str,
+            typer.Argument(help="Camera name. Must be a cloud source.")],
+    configuration_file:
+        Annotated[Path,
+            typer.Option("--configuration-file","-C",
+                help="Configuration file.")] =
+            Configuration.default_configuration_path(),
+    target:
+        Annotated[str,
+            typer.Option("--target","-T",
+                help="Target to import to. Default specified in configuration file.")]
+            = None,
+    card:
+        Annotated[str,
+            typer.Option("--card","-c",
+                help="Cloud drive to import from. Default specified in configuration file.")]
+            = None,
+    dry_run: Annotated[bool,
+            typer.Option(help="Explain what would be done, but do nothing.")]
+            = False,
+    leave_originals:
+        Annotated[bool,
+            typer.Option(help="Leave original files in the cloud folder.")]
+            = False,
+    overwrite_target:
+        Annotated[bool,
+            typer.Option(help="If target files exist, overwrite them instead of skipping.")]
+            = False,
+    settle:
+        Annotated[float,
+            typer.Option(help="Seconds a file must stay unchanged before it's imported.")]
+            = 2.0):
+    # Configuration
+    config.action = Configuration.Action.WATCH
+    config.configuration_file = configuration_file
+    config.target = target
+    config.card = card
+    config.dry_run = dry_run
+    config.leave_originals = leave_originals
+    config.overwrite_target = overwrite_target
+    config.camera = camera
+    logger.info('ACTION: Watch')
+    config.read_configuration()
+    config.parse_configuration()
+    config.find_source_path()
+    config.validate()
+    if not config.is_cloud_source():
+        logger.error(f"Watch: {config.camera} is not a cloud source")
+        die(f"{config.camera} is not a cloud source. Use import for cards.")
+    # Time for action
+    from photo_processing import ImportQueue
+    from watcher import SourceWatcher
+
+    print_boxed_text("PHOTO IMPORTINATOR: WATCH")
+    config.skip_backup = True
+    print_settings(config,[f"Watching, importing files unchanged for {settle} s."])
+    ask_confirmation("Watch cancelled.")
+
+    queue = ImportQueue(config)
+    watcher = SourceWatcher(config.get_source_folders(),settle_time=settle)
+    watcher.start()
+    if watcher.polling:
+        print("(Install watchdog to get notified of changes instead of polling.)")
+    print("Watching for new photos. Press Ctrl+C to stop.")
+    try:
+        for batch in watcher.batches():
+            batch_start = time.time()
+            count = queue.run_batch(batch)
+            if count > 0:
+                logger.info(f"Watch: {count} files imported in {time.time() - batch_start:.1f} s")
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        watcher.stop()
+
+    queue.print_status()
+    logger.info(f'Watch finished, {queue.job_count} files imported')
+    sys.exit(0)
+
 @app.command(name="list",
              help="List cameras and targets.")
 def command_list_cameras_and_targets(
@@ -205,16 +385,21 @@ def command_running_stats(
     sys.exit(0)
 
 @app.command(name="purge",
-             help="Delete log file or running stats.")
+             help="Delete log file, running stats or the conversion cache.")
 def command_purge(
-    to_be_purged: # TODO: Should validate if this is 'log' or 'stats'.
+    to_be_purged: # TODO: Should validate if this is 'log', 'stats' or 'cache'.
         Annotated[str,
-            typer.Argument(help="'log' or 'stats'.")]):
+            typer.Argument(help="'log', 'stats' or 'cache'.")],
+    configuration_file:
+        Annotated[Path,
+            typer.Option("--configuration-file", "-C",
+                         help="Configuration file (for finding the cache).")] =
+            Configuration.default_configuration_path()):
     # TODO: if running stats/log file custom paths are ever implemented, this should parse config, I guess.
     if to_be_purged == 'log':
         config.action = Configuration.Action.PURGE_LOG_FILE
         logger.info('ACTION: Purge log files')  # :-(
-        logging.shutdown()
+        stop_logging()
         os.unlink(logfile_path())
         print(f"Purged Photo Importinator log file {logfile_path().absolute()}")
     elif to_be_purged == 'stats':
@@ -222,12 +407,51 @@ def command_purge(
         logger.info('ACTION: Purge running stats')
         os.unlink(config.running_stats_path())
         print(f"Running stats file {config.running_stats_path()} removed, stats are now reset")
+    elif to_be_purged == 'cache':
+        logger.info('ACTION: Purge conversion cache')
+        config.configuration_file = configuration_file
+        config.read_configuration()
+        config.parse_conversion_cache()
+        if config.conversion_cache_path is None:
+            print("No conversion cache configured.")
+            sys.exit(1)
+        from conversion_cache import ConversionCache
+        ConversionCache(config.conversion_cache_path,config.conversion_cache_max_size).purge()
+        print(f"Conversion cache {config.conversion_cache_path} emptied")
     else:
         logger.error(f'ACTION: Invalid purge target {to_be_purged}')
         print(f"I don't know how to purge {to_be_purged}")
         sys.exit(1)
     sys.exit(0)
 
+@app.command(name="embed",
+             help="Write XMP sidecars into the files they belong to.")
+def command_embed(
+    directory:
+        Annotated[Path,
+            typer.Argument(help="Folder with the sidecars (subfolders included).")],
+    keep_sidecars:
+        Annotated[bool,
+            typer.Option(help="Don't delete the sidecars afterwards.")]
+            = False,
+    dry_run:
+        Annotated[bool,
+            typer.Option(help="Explain what would be done, but do nothing.")]
+            = False,
+    jobs:
+        Annotated[int,
+            typer.Option(help="How many files to work on at once.")]
+            = 4):
+    logger.info('ACTION: Embed')
+    config.action = Configuration.Action.EMBED
+    if not directory.is_dir():
+        logger.error(f"Embed: {directory} is not a directory")
+        die(f"{directory} is not a directory.")
+    # Time for action
+    import metadata
+    metadata.embed_all(directory,keep_sidecars,dry_run,jobs)
+    sys.exit(0)
+
 @app.command(name="scan",
              help="Examine source photos and produce a CSV-formatted import preview.")
 def command_scan(
@@ -304,6 +528,7 @@ def command_unpack(
     config.find_source_path()
     config.validate()
     # Time for action
+    import archival
     archival.unpack_all(config)
     sys.exit(0)
 
@@ -319,7 +544,7 @@ def main() -> int:
     if delete_old_log and os.path.exists(logfile_path()):
         os.unlink(logfile_path())
     # Start logging
-    logging.basicConfig(level=log_level,filename=logfile_path())
+    start_logging(logfile_path(),log_level)
     logger.info('Photo Importinator started.')
 
     # Parse command line, parse configuration as needed, do our activities.
@@ -7,22 +7,29 @@
 # for the full license terms.
 
 import os, sys
+import stat
+import queue
+import threading
 import datetime
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from abc import ABC, abstractmethod
 import time
+import itertools
 from enum import Enum
 import logging
 import subprocess
 import shutil
-import exiv2
 from rich import print
-from rich.progress import Progress, SpinnerColumn
+from rich.progress import Progress, SpinnerColumn, FileSizeColumn, TotalFileSizeColumn
 from dazzle import *
 import archival
 from configuration import Configuration
 from running_stats import RunningStats
+from instrumentation import span
+from scheduler import IOScheduler, device_for, STREAM_QUEUE_SIZE
+from conversion_cache import ConversionCache
+from metadata import read_metadata, MetadataWriter, write_metadata, write_sidecar
 
 logger = logging.getLogger(__name__)
 
@@ -40,67 +47,9 @@ def identify_file(file:Path) -> str:
         case _:
             return s
 
-def read_date(file:Path) -> datetime.datetime:
-    """Reads the date for the specified image file. Will try to grab the
-    original date from EXIF, or failing that, file modification time."""
-    mtime = datetime.datetime.fromtimestamp(os.path.getmtime(file))
-    try:
-        img = exiv2.ImageFactory.open(str(file))
-    except exiv2.Exiv2Error:
-        return None
-    img.readMetadata()
-    img_data = img.exifData()
-    date_raw = img_data["Exif.Photo.DateTimeOriginal"].getValue()
-    if date_raw is None:
-        date = mtime
-    else:
-        try:
-            date = datetime.datetime.strptime(str(date_raw),'%Y:%m:%d %H:%M:%S')
-        except ValueError:
-            date = mtime
-    return date
-
-def fix_dng_rating_from_raw(source_raw:Path, target_dng:Path):
-    """Read XMP rating from specified Raw format image.
-    If the rating is present and isn't 0, save the rating to the
-    specified DNG format image.
-    This is to fix the rating not getting carried over during conversion
-    for some reason or other."""
-    if not source_raw.exists():
-        logger.info(f"DNG rating fix: source {source_raw} doesn't exist.")
-        return
-    if not target_dng.exists():
-        logger.info(f"DNG rating fix: target {target_dng} doesn't exist.")
-        return
-    try:
-        source_img = exiv2.ImageFactory.open(str(source_raw))
-    except exiv2.Exiv2Error:
-        logger.info(f"DNG rating fix: Opening source image {source_raw} for reading failed.")
-        return
-    try:
-        target_img = exiv2.ImageFactory.open(str(target_dng))
-    except exiv2.Exiv2Error:
-        logger.info(f"DNG rating fix: Opening targer image {target_dng} for reading failed.")
-        return
-    source_img.readMetadata()
-    target_img.readMetadata()
-    source_img_data = source_img.xmpData()
-    target_img_data = target_img.xmpData()
-    try:
-        rating = source_img_data["Xmp.xmp.Rating"].getValue()
-    except exiv2.Exiv2Error:
-        rating = 0
-    if rating != 0:
-        try:
-            target_img_data["Xmp.xmp.Rating"] = rating
-            target_img.writeMetadata()
-        except exiv2.Exiv2Error:
-            logger.info(f"DNG rating fix: Saving metadata to {target_dng} failed.")
-            warn(f"Copying rating from {source_raw} to {target_dng} failed.")
-
 ###### Photo processing task #############################################
 
-@dataclass
+@dataclass(slots=True)
 class Task(ABC):
     """A (potentially parallelisable) task. Keeps track of the state of the
     process and stats. Must be subclassed."""
@@ -118,6 +67,25 @@ class Task(ABC):
     start_time:time = None
     end_time:time = None
     total_time:float = None
+    task_id:int = None
+    # IDs of the devices the task reads from and writes to.
+    devices:tuple = ()
+
+    # Source of task IDs. The IDs are only used to tell the tasks apart in the log.
+    _task_ids = itertools.count(1)
+
+    def _new_task_id(self):
+        self.task_id = next(Task._task_ids)
+
+    def io_size(self) -> int:
+        """How many bytes the task will read/write. Used for measuring
+        device throughput."""
+        return 0
+
+    def _log_extra(self,**fields) -> dict:
+        """Structured fields for log records about this task (shown in the
+        JSON log format)."""
+        return {'task_id': self.task_id, **fields}
 
     @abstractmethod
     def _execute(self):
@@ -128,26 +96,36 @@ class Task(ABC):
         """Perform the task. This method will actually just perform the timekeeping
         for the task; actual task is defined in the _execute method in the subclass."""
         self.start_time = time.time()
-        self._execute()
+        with span(type(self).__name__):
+            self._execute()
         self.end_time = time.time()
         self.total_time = self.end_time - self.start_time
+        logger.info(f"Task {self.task_id} finished: {self.status}, took {self.total_time:.3f}s",
+                    extra=self._log_extra(status=str(self.status),duration=self.total_time))
 
-@dataclass
+@dataclass(slots=True)
 class BackupTask(Task):
     """A task for performing backups. Will pack files from source folder to an archive file."""
     source: Path = None
     target: Path = None
     skip:bool = False
-    def __init__(self,configuration:Configuration):
+    # Progress bar shared with other backups running at the same time.
+    bar:Progress = None
+    def __init__(self,configuration:Configuration,bar:Progress=None):
+        Task.__init__(self)
+        self._new_task_id()
+        self.skip = False
+        self.bar = bar
         if configuration.dry_run or configuration.skip_backup:
             self.skip = True
         self.target = configuration.backup_path / Path(f"{configuration.camera}_{configuration.date_to_filename()}.7z")
         self.source = configuration.source_path
+        self.devices = (device_for(self.source), device_for(configuration.backup_path))
     def _execute(self):
         if not self.skip:
             logger.info(f"Backup: {self.source} to {self.target}")
             print(f"Backing up from {self.source} to {self.target}...")
-            archival.archive(self.source, self.target)
+            archival.archive(self.source, self.target, self.bar)
             print(f"Done!")
             self.status = Task.Status.DONE
         else:
@@ -155,83 +133,142 @@ class BackupTask(Task):
             skip_warn("Backup skipped.")
             self.status = Task.Status.SKIPPED
 
-@dataclass
-class MoveTask(Task):
-    """Task representing image moving or conversion."""
-
-    source_file:Path = None
-    target_file:Path = None
-    pertinent_date:datetime = None
-    file_type:str = None
-    convert:bool = False
+@dataclass(frozen=True,slots=True)
+class ImportSettings:
+    """The settings move tasks need. Taken from the configuration once and
+    shared by all of the tasks, instead of every task having a copy."""
     dry_run:bool = False
     skip_import:bool = False
     leave_originals:bool = False
     overwrite_target:bool = False
+    convert_raw:frozenset = frozenset()
     dnglab_path:Path = None
-    dnglab_flags:list = None
-    def __init__(self,configuration:Configuration,source_file:Path,target_file:Path,pertinent_date:datetime=None):
-        # Note: configuration is only read, not stored.
-        # TODO: Is it really such a bad thing not to store the configuration locally?
-        self.source_file = source_file
-        self.target_file = target_file
+    dnglab_flags:tuple = None
+    conversion_cache:ConversionCache = None
+    # Metadata keys to carry over from raw files to converted DNGs.
+    carry_over:tuple = ()
+    # Writes the carried over metadata. If there's none, it's written
+    # right after conversion.
+    metadata_writer:MetadataWriter = None
+    # Write the carried over metadata to sidecars instead of the files.
+    sidecars:bool = False
+    # Directories and device pairs are shared by lots of tasks, so only one
+    # copy of each is kept around. The import queue empties this when it's
+    # done.
+    shared_values:dict = field(default_factory=dict,compare=False,repr=False)
+
+    @staticmethod
+    def from_configuration(configuration:Configuration) -> 'ImportSettings':
+        return ImportSettings(
+            carry_over=tuple(configuration.carry_over or ()),
+            sidecars=configuration.metadata_mode == Configuration.MetadataMode.SIDECAR,
+            dry_run=configuration.dry_run,
+            skip_import=configuration.skip_import,
+            leave_originals=configuration.leave_originals,
+            overwrite_target=configuration.overwrite_target,
+            convert_raw=frozenset(configuration.convert_raw or ()),
+            dnglab_path=configuration.dnglab_path,
+            dnglab_flags=None if configuration.dnglab_flags is None else tuple(configuration.dnglab_flags),
+            conversion_cache=None if configuration.conversion_cache_path is None
+                else ConversionCache(configuration.conversion_cache_path,configuration.conversion_cache_max_size))
+
+    def is_conversion_needed(self,path:Path) -> bool:
+        """Same as `Configuration.is_conversion_needed`."""
+        return path.suffix.upper() in self.convert_raw
+
+    def shared(self,value):
+        """Returns the one copy of `value` the tasks share."""
+        return self.shared_values.setdefault(value,value)
+
+@dataclass(slots=True)
+class MoveTask(Task):
+    """Task representing image moving or conversion. The source and target
+    paths are kept as a (shared) directory and a file name, which takes a
+    lot less memory than full paths for every task."""
+
+    settings:ImportSettings = None
+    source_dir:Path = None
+    source_name:str = None
+    target_dir:Path = None
+    target_name:str = None
+    pertinent_date:datetime = None
+    file_size:int = None
+    rating:int = 0
+    carry_over:dict = None
+    convert:bool = False
+    def __init__(self,settings:ImportSettings,source_file:Path,target_file:Path,pertinent_date:datetime=None,file_size:int=None,rating:int=0,carry_over:dict=None):
+        # With tens of thousands of tasks, every byte counts, so the settings
+        # are shared.
+        Task.__init__(self)
+        self._new_task_id()
+        self.settings = settings
+        self.source_dir = settings.shared(source_file.parent)
+        self.source_name = source_file.name
+        self.target_dir = settings.shared(target_file.parent)
+        # Usually the same name, so don't keep two copies of it.
+        self.target_name = self.source_name if target_file.name == self.source_name else target_file.name
         self.pertinent_date = pertinent_date
-        self.file_type = identify_file(source_file)
-        self.convert = configuration.is_conversion_needed(source_file)
-        self.skip_import = configuration.skip_import
-        self.dry_run = configuration.dry_run
-        self.leave_originals = configuration.leave_originals
-        self.overwrite_target = configuration.overwrite_target
+        if file_size is None:
+            file_size = os.path.getsize(source_file)
+        self.file_size = file_size
+        self.rating = rating
+        self.carry_over = carry_over
+        self.convert = settings.is_conversion_needed(source_file)
         if self.convert:
-            self.target_file = dng_suffix_for(self.target_file)
+            self.target_name = dng_suffix_for(target_file).name
         self.status = Task.Status.READY
-        self.dnglab_path = configuration.dnglab_path
-        self.dnglab_flags = configuration.dnglab_flags
+        self.devices = settings.shared((device_for(self.source_dir), device_for(self.target_dir)))
+
+    @property
+    def source_file(self) -> Path:
+        return self.source_dir / self.source_name
+
+    @property
+    def target_file(self) -> Path:
+        return self.target_dir / self.target_name
+
+    @property
+    def file_type(self) -> str:
+        return identify_file(self.source_file)
+
+    def io_size(self) -> int:
+        return self.file_size
 
     def _move(self):
         """Will either move the file to target folder, or copy it,
         depending on whether we want to leave the originals."""
         # TODO: Error checking?
-        move_msg(self.source_file,self.target_file)
-        if self.leave_originals:                
-            shutil.copy(self.source_file,self.target_file)
-            logger.info(f"Copied: {self.source_file} to {self.target_file}")
+        with span('console'):
+            move_msg(self.source_file,self.target_file,self.file_size)
+        if self.settings.leave_originals:
+            with span('copy'):
+                shutil.copy(self.source_file,self.target_file)
+            logger.info(f"Copied: {self.source_file} to {self.target_file}",
+                        extra=self._log_extra(bytes=self.file_size))
         else:
-            shutil.move(self.source_file,self.target_file)
-            logger.info(f"Moved: {self.source_file} to {self.target_file}")
+            with span('move'):
+                shutil.move(self.source_file,self.target_file)
+            logger.info(f"Moved: {self.source_file} to {self.target_file}",
+                        extra=self._log_extra(bytes=self.file_size))
         self.status = Task.Status.DONE
 
-    def _convert(self):
-        """Convert the raw file using dnglab and remove the original
-        (if desired)."""
-        convert_msg(self.source_file,self.target_file)
-        logger.info(f"Converting: {self.source_file} to {self.target_file}")
-        self.status = Task.Status.RUNNING
-
-        if self.target_file.exists():
-            if self.overwrite_target:
-                logger.debug(f"{self.source_file}: pre-existing target file {self.target_file} removed.")
-                os.unlink(self.target_file)
-            else:
-                logger.info(f"{self.source_file} skipped, {self.target_file} exists.")
-                skip_warn(f"{self.source_file}: Target file {self.target_file} exists. Skipped.")
-                self.status = Task.Status.SKIPPED
-                return
-
+    def _run_dnglab(self) -> bool:
+        """Run dnglab to convert the file. Returns True if it went well."""
         # Come up with full command line invocation of dnglab, as a list.
-        if self.dnglab_flags is not None:
-            cmd = [self.dnglab_path,'convert']
-            cmd.extend(self.dnglab_flags)
+        if self.settings.dnglab_flags is not None:
+            cmd = [self.settings.dnglab_path,'convert']
+            cmd.extend(self.settings.dnglab_flags)
             cmd.append(self.source_file)
             cmd.append(self.target_file)
         else:
-            cmd = [self.dnglab_path,'convert',self.source_file,self.target_file]
+            cmd = [self.settings.dnglab_path,'convert',self.source_file,self.target_file]
         logger.info(f"Convert parameters: {cmd}")
 
         # Run dnglab and deal with the results.
         try:
             # Let's try running dnglab.
-            result = subprocess.run(cmd,capture_output=True,check=True)
+            with span('dnglab'):
+                result = subprocess.run(cmd,capture_output=True,check=True)
             # OK, if it didn't blow up immediately, we have some results to deal with now.
             try:
                 # If everything went well, dnglab will report 1/1 files converted.
@@ -244,41 +281,95 @@ class MoveTask(Task):
                 # some obscure reason.
                 logger.error(f"Conversion failed, dnglab reported no conversion, "+
                              f"return code {result.returncode} - "+
-                             f"stdout: {result.stdout} stderr: {result.stderr}")
+                             f"stdout: {result.stdout} stderr: {result.stderr}",
+                             extra=self._log_extra())
                 warn("dnglab reported no conversion took place.")
                 run_successfully = False
                 self.status = Task.Status.FAILURE
-        except subprocess.CalledProcessError:
+        except subprocess.CalledProcessError as error:
             # Something went so wrong running dnglab that there was a non-zero
             # return code. Which means something went horribly wrong with the
             # conversion.
-            logger.error(f"Conversion failed with return code {result.returncode} - "+
-                         f"stdout: {result.stdout} stderr: {result.stderr}")
-            warn(f"dnglab reported an error. See log file. (Return code {result.returncode})")
+            logger.error(f"Conversion failed with return code {error.returncode} - "+
+                         f"stdout: {error.stdout} stderr: {error.stderr}",
+                         extra=self._log_extra())
+            warn(f"dnglab reported an error. See log file. (Return code {error.returncode})")
             run_successfully = False
             self.status = Task.Status.FAILURE
-        # Fix the rating.
-        fix_dng_rating_from_raw(self.source_file,self.target_file)
+        return run_successfully
+
+    def _convert(self):
+        """Convert the raw file using dnglab and remove the original
+        (if desired)."""
+        with span('console'):
+            convert_msg(self.source_file,self.target_file,self.file_size)
+        logger.info(f"Converting: {self.source_file} to {self.target_file}",
+                    extra=self._log_extra(bytes=self.file_size))
+        self.status = Task.Status.RUNNING
+
+        if self.target_file.exists():
+            if self.settings.overwrite_target:
+                logger.debug(f"{self.source_file}: pre-existing target file {self.target_file} removed.")
+                os.unlink(self.target_file)
+            else:
+                logger.info(f"{self.source_file} skipped, {self.target_file} exists.",
+                            extra=self._log_extra())
+                skip_warn(f"{self.source_file}: Target file {self.target_file} exists. Skipped.")
+                self.status = Task.Status.SKIPPED
+                return
+
+        # Converted this one before? Then it's just a copy.
+        cache = self.settings.conversion_cache
+        cache_key = None
+        if cache is not None:
+            with span('cache_key'):
+                cache_key = cache.key(self.source_file,self.settings.dnglab_path,self.settings.dnglab_flags)
+        if cache_key is not None:
+            with span('cache_fetch'):
+                cached = cache.fetch(cache_key,self.target_file)
+        else:
+            cached = False
+        if cached:
+            logger.info(f"{self.source_file}: converted DNG found in the cache.",
+                        extra=self._log_extra())
+            run_successfully = True
+        else:
+            run_successfully = self._run_dnglab()
+            if run_successfully and cache_key is not None:
+                with span('cache_store'):
+                    cache.store(cache_key,self.target_file)
+
+        # Carry the metadata (read when the queue was populated) over to
+        # the DNG. dnglab doesn't do it.
+        if run_successfully and self.carry_over is not None:
+            if self.settings.metadata_writer is not None:
+                self.settings.metadata_writer.submit(self.target_file,self.carry_over)
+            else:
+                write = write_sidecar if self.settings.sidecars else write_metadata
+                with span('metadata_write'):
+                    if not write(self.target_file,self.carry_over):
+                        warn(f"Carrying metadata over to {self.target_file} failed.")
         # If we failed to convert, delete the target file.
         if not run_successfully and self.target_file.exists():
             os.unlink(self.target_file)
         # Delete source file if we were successful (and we actually want it)
-        if run_successfully and not self.leave_originals:
+        if run_successfully and not self.settings.leave_originals:
             os.unlink(self.source_file)
         # If we didn't report anything weird before, we're ready to call it quits now.
         if self.status == Task.Status.RUNNING:
             self.status = Task.Status.DONE
 
     def _execute(self):
-        if self.skip_import or self.dry_run:
-            logger.info(f"Skipped: {self.source_file} to {self.target_file}")
+        if self.settings.skip_import or self.settings.dry_run:
+            logger.info(f"Skipped: {self.source_file} to {self.target_file}",
+                        extra=self._log_extra())
             skip_warn(f"Skipped: {self.source_file} to {self.target_file}")
             self.status = Task.Status.SKIPPED
             return
         # Create target folder if it doesn't exist
-        if not self.target_file.parent.exists():
-            self.target_file.parent.mkdir(parents=True,exist_ok=True) # Basically same as mkdirhier
-            logger.info(f"Created directory {self.target_file.parent}")
+        if not self.target_dir.exists():
+            self.target_dir.mkdir(parents=True,exist_ok=True) # Basically same as mkdirhier
+            logger.info(f"Created directory {self.target_dir}")
         # We handle the file. Finally.
         if not self.convert:
             # Move or copy the file.
@@ -287,7 +378,7 @@ class MoveTask(Task):
             self._convert()
         # TODO: Further error checking/reporting here?
     def print_status(self):
-        print(f"{self.source_file}\n  Format: {self.file_type} * Convert: {self.convert} * Dry run: {self.dry_run}\n :right_arrow: {self.target_file}")
+        print(f"{self.source_file}\n  Format: {self.file_type} * Convert: {self.convert} * Dry run: {self.settings.dry_run}\n :right_arrow: {self.target_file}")
 
 ###### Import queue ######################################################
 
@@ -295,69 +386,166 @@ class ImportQueue:
     """The main photo import queue."""
 
     _config:Configuration = None
+    settings:ImportSettings = None
     running_stats:RunningStats = None
-    jobs:list = []
+    scheduler:IOScheduler = None
+    jobs:list = None
 
     day_counts:dict = {}
     status_counts:dict = {}
 
+    # When streaming (or watching), the jobs aren't kept around, only
+    # counted and tallied as they finish.
+    job_count:int = 0
+    _tallying:bool = False
+
+    start_time:float = None
+    # Seconds from start_time until the first photo, and the first rated
+    # photo, were done.
+    first_photo_latency:float = None
+    first_rated_latency:float = None
+
     def __init__(self,configuration:Configuration):
         """Create the import queue."""
+        self.start_time = time.time()
+        self.jobs = []
+        self.status_counts = {}
         self._config = configuration
+        self.settings = replace(ImportSettings.from_configuration(self._config),
+                                metadata_writer=MetadataWriter(self._config.metadata_mode == Configuration.MetadataMode.SIDECAR))
+        # Cameras to import from: (configuration, settings) for each.
+        self.sources = [(self._config, self.settings)]
         self.running_stats = RunningStats(self._config)
+        self.scheduler = IOScheduler(order=self._config.queue_order,lanes=self._config.queue_lanes)
+
+    def add_source(self,configuration:Configuration):
+        """Add another camera to import from, into the same queue. The
+        conversion settings are the same for all cameras, so the metadata
+        writer and conversion cache are shared."""
+        settings = replace(ImportSettings.from_configuration(configuration),
+                           metadata_writer=self.settings.metadata_writer,
+                           conversion_cache=self.settings.conversion_cache,
+                           shared_values=self.settings.shared_values)
+        self.sources.append((configuration, settings))
 
     def populate(self):
         """Populates the job queue. Will walk the source folder, create tasks, and add them to the queue."""
-        source_dirs = self._config.get_source_folders()
+        self.jobs.extend(self.walk())
+        self.job_count = len(self.jobs)
+
+    def walk(self):
+        """Walks the source folders and yields a move task for each file."""
+        if len(self.sources) == 1:
+            yield from self._walk_source(*self.sources[0])
+        else:
+            yield from self._walk_in_parallel()
+
+    def _walk_source(self,configuration:Configuration,settings:ImportSettings):
+        source_dirs = configuration.get_source_folders()
         for source_path in source_dirs:
             print(f"Processing source path: {source_path}")
             for root, dirs, files in os.walk(source_path):
+                root = Path(root)
                 for file in files:
-                    # Get the file's full name
-                    fqfile = Path(root) / file
-                    # Skip non-files
-                    if not os.path.isfile(fqfile):
-                        continue
-                    # Is this one of the files we want to ignore?
-                    if self._config.ignore is not None:
-                        ign = False
-                        for ignored in self._config.ignore:
-                            if str(file) == ignored:
-                                ign = True
-                        if ign == True:
-                            logger.info(f"{fqfile} ignored")
-                            skip_warn(f"{fqfile} ignored")
-                            continue
-                    # OK, we're now positive we have a file we need to deal with somehow.
-                    # Read the date.
-                    date = read_date(fqfile)
-                    if date is None:
-                        logger.warning(f"File {fqfile} cannot be read by Exiv2. Skipping.")
-                        skip_warn(f"Date for {fqfile} cannot be read. Skipping.")
-                        continue
-                    # Figure out target directory and file name.
-                    target_dir = self._config.target_path / self._config.date_to_path(date)
-                    target_file = target_dir / file
-                    # Create the actual move task and put it in the queue.
-                    task = MoveTask(self._config,fqfile,target_file,date)
-                    self.jobs.append(task)
+                    task = self.task_for(root / file,configuration,settings)
+                    if task is not None:
+                        yield task
+
+    def _walk_in_parallel(self):
+        """Walks several sources. Sources on different devices (i.e. in
+        different card readers) are walked at the same time, the ones on
+        the same device one after another."""
+        groups:dict = {}
+        for source in self.sources:
+            groups.setdefault(device_for(source[0].source_path),[]).append(source)
+        found = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        done = object()
+        def walk_group(sources:list):
+            try:
+                for source in sources:
+                    for task in self._walk_source(*source):
+                        found.put(task)
+            except BaseException as error:
+                found.put(error)
+            finally:
+                found.put(done)
+        for sources in groups.values():
+            threading.Thread(target=walk_group,args=(sources,),name='SourceWalker',daemon=True).start()
+        walking = len(groups)
+        while walking > 0:
+            item = found.get()
+            if item is done:
+                walking -= 1
+            elif isinstance(item,BaseException):
+                raise item
+            else:
+                yield item
+
+    def task_for(self,fqfile:Path,configuration:Configuration=None,settings:ImportSettings=None) -> MoveTask:
+        """Creates the move task for a single source file, from the given
+        source (by default, the first one). Returns None if the file is to
+        be skipped."""
+        if configuration is None:
+            configuration, settings = self.sources[0]
+        # Skip non-files. (The size is kept for scheduling and progress.)
+        try:
+            file_stat = os.stat(fqfile)
+        except OSError:
+            return None
+        if not stat.S_ISREG(file_stat.st_mode):
+            return None
+        # Is this one of the files we want to ignore?
+        file = fqfile.name
+        if configuration.ignore is not None:
+            ign = False
+            for ignored in configuration.ignore:
+                if str(file) == ignored:
+                    ign = True
+            if ign == True:
+                logger.info(f"{fqfile} ignored")
+                skip_warn(f"{fqfile} ignored")
+                return None
+        # OK, we're now positive we have a file we need to deal with somehow.
+        # Read the date, rating, and whatever needs to be carried
+        # over to the DNG, if we're converting.
+        if settings.is_conversion_needed(fqfile):
+            carry_over = settings.carry_over
+        else:
+            carry_over = ()
+        with span('read_metadata'):
+            metadata = read_metadata(fqfile,carry_over)
+        if metadata is None:
+            logger.warning(f"File {fqfile} cannot be read by Exiv2. Skipping.")
+            skip_warn(f"Date for {fqfile} cannot be read. Skipping.")
+            return None
+        date = metadata.date
+        # Figure out target directory and file name.
+        target_dir = configuration.target_path / configuration.date_to_path(date)
+        target_file = target_dir / file
+        # Create the actual move task.
+        return MoveTask(settings,fqfile,target_file,date,file_stat.st_size,metadata.rating,metadata.carry_over)
+
+    def _tally(self,job:Task):
+        """Add a finished job to the statistics."""
+        # Update status counts.
+        if job.status not in self.status_counts:
+            self.status_counts[job.status] = 1
+        else:
+            self.status_counts[job.status] += 1
+        # Update day count.
+        if type(job) is MoveTask \
+            and job.pertinent_date is not None \
+            and job.status == Task.Status.DONE:
+            self.running_stats.increment_day(job.pertinent_date.date())
 
-    
     def update_stats(self):
         """Recalculate job queue statistics."""
-        self.day_counts = {}
-        self.status_counts = {}
-        for job in self.jobs:
-            # Update status counts.
-            if job.status not in self.status_counts:
-                self.status_counts[job.status] = 1
-            else:
-                self.status_counts[job.status] += 1
-            # Update day count.
-            if type(job) is MoveTask \
-                and job.pertinent_date is not None \
-                and job.status == Task.Status.DONE:
-                self.running_stats.increment_day(job.pertinent_date.date())
+        if not self._tallying:
+            # Otherwise the jobs were tallied as they finished.
+            self.day_counts = {}
+            self.status_counts = {}
+            for job in self.jobs:
+                self._tally(job)
         self.running_stats.save()
     def print_status_counts(self):
         """Prints out queue status statistics."""
@@ -374,18 +562,131 @@ class ImportQueue:
         Will refresh statistics."""
         print_boxed_text("Queue Statistics")
         self.update_stats()
-        job_cnt = len(self.jobs)        
-        print(f"{job_cnt} jobs queued.")
+        print(f"{self.job_count} jobs queued.")
         self.print_status_counts()
         self.print_day_counts()
+        self.scheduler.print_device_stats()
+        self.print_cache_stats()
+        self.print_metadata_stats()
+        self.print_first_useful_latency()
 
-    def run(self):
-        """Run all of the tasks in the queue."""
-        with Progress(
+    def print_cache_stats(self):
+        """Prints out how well the conversion cache did."""
+        cache = self.settings.conversion_cache
+        if cache is None or cache.hits + cache.misses == 0:
+            return
+        print(f"\n[bright_white]Conversion cache:[/bright_white] {cache.hits} hits, {cache.misses} misses")
+
+    def print_metadata_stats(self):
+        """Prints out how many files got their metadata carried over, and
+        how many didn't."""
+        writer = self.settings.metadata_writer
+        if writer is None or writer.written + writer.failed == 0:
+            return
+        print(f"\n[bright_white]Metadata carried over:[/bright_white] {writer.written} files, {writer.failed} failed")
+        logger.info(f"Metadata carried over to {writer.written} files, {writer.failed} failed")
+
+    def print_first_useful_latency(self):
+        """Prints out how long it took for the first useful photo to arrive:
+        the first rated one, or if nothing was rated, the first one."""
+        if self.first_rated_latency is not None:
+            print(f"\n[bright_white]First rated photo available after {self.first_rated_latency:.1f} s.[/bright_white]")
+        elif self.first_photo_latency is not None:
+            print(f"\n[bright_white]First photo available after {self.first_photo_latency:.1f} s.[/bright_white]")
+
+    def _job_done(self,job:MoveTask):
+        """Keep track of when the first photos arrive."""
+        if job.status != Task.Status.DONE:
+            return
+        if self.first_photo_latency is None:
+            self.first_photo_latency = time.time() - self.start_time
+            logger.info(f"First photo {job.target_file} available after "+
+                        f"{self.first_photo_latency:.1f} s",
+                        extra=job._log_extra(duration=self.first_photo_latency))
+        if self.first_rated_latency is None and job.rating > 0:
+            self.first_rated_latency = time.time() - self.start_time
+            logger.info(f"First rated photo {job.target_file} available after "+
+                        f"{self.first_rated_latency:.1f} s",
+                        extra=job._log_extra(duration=self.first_rated_latency))
+
+    def _progress_bar(self):
+        # Progress (and the time estimate) is counted in bytes rather than
+        # files, so a few big videos don't throw the estimate off.
+        return progress_bar(
             SpinnerColumn(),
-            *Progress.get_default_columns()
-        ) as bar:
-            bar_task = bar.add_task("[yellow]Running queued jobs...",total=len(self.jobs))
-            for job in self.jobs:
-                job.execute()
-                bar.update(bar_task,advance=1)
+            *Progress.get_default_columns(),
+            ' | ',
+            FileSizeColumn(),
+            '/',
+            TotalFileSizeColumn()
+        )
+
+    def run(self):
+        """Run all of the tasks in the queue. The tasks are run in parallel,
+        as many at a time as the devices involved can keep up with (see
+        `scheduler.IOScheduler`)."""
+        total_size = sum(job.io_size() for job in self.jobs)
+        restart_summary_clock()
+        with self._progress_bar() as bar:
+            bar_task = bar.add_task("[yellow]Running queued jobs...",total=total_size)
+            def job_done(job:MoveTask):
+                bar.update(bar_task,advance=job.io_size())
+                self._job_done(job)
+            # Whatever made it to the metadata writer still gets written,
+            # even if the run is cut short.
+            try:
+                self.scheduler.run(self.jobs,on_done=job_done)
+            finally:
+                self.settings.metadata_writer.finish()
+        self.settings.shared_values.clear()
+
+    def run_streaming(self):
+        """Walk the source folder and run the tasks as they are found,
+        instead of populating the whole queue first. The first files reach
+        the target within seconds, and the finished jobs are only counted,
+        not kept, so memory use stays flat however big the card is."""
+        self._tallying = True
+        restart_summary_clock()
+        with self._progress_bar() as bar:
+            bar_task = bar.add_task("[yellow]Running jobs as they're found...",total=0)
+            found_count = 0
+            found_size = 0
+            def counted(tasks):
+                # Runs in the walker thread.
+                nonlocal found_count, found_size
+                for task in tasks:
+                    found_count += 1
+                    found_size += task.io_size()
+                    bar.update(bar_task,total=found_size)
+                    yield task
+            def job_done(job:MoveTask):
+                bar.update(bar_task,advance=job.io_size())
+                self.job_count += 1
+                self._tally(job)
+                self._job_done(job)
+            try:
+                self.scheduler.run_streaming(counted(self.walk()),on_done=job_done)
+            finally:
+                self.settings.metadata_writer.finish()
+        self.settings.shared_values.clear()
+        logger.info(f"{found_count} files found, {archival.human_size(found_size)}",
+                    extra={'bytes': found_size})
+
+    def run_batch(self,files:list) -> int:
+        """Import the given source files right away (for watch mode). The
+        finished jobs are only counted, like when streaming. Returns the
+        number of jobs run."""
+        self._tallying = True
+        tasks = [task for task in map(self.task_for,files) if task is not None]
+        if len(tasks) == 0:
+            return 0
+        def job_done(job:MoveTask):
+            self.job_count += 1
+            self._tally(job)
+        try:
+            self.scheduler.run(tasks,on_done=job_done)
+        finally:
+            self.settings.metadata_writer.finish()
+        self.settings.shared_values.clear()
+        self.running_stats.save()
+        return len(tasks)
@@ -0,0 +1,293 @@
+#!/usr/bin/python
+##########################################################################
+# Photo Importinator III: This Time It's Python For Some Reason
+##########################################################################
+# (c) 2026 Rose Midford.
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+
+import os
+import time
+import datetime
+import queue
+import functools
+import threading
+from pathlib import Path
+from typing import Iterable
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import logging
+from rich import print
+
+from archival import human_size
+from configuration import Configuration
+
+logger = logging.getLogger(__name__)
+
+# Files at least this big go to the large file lane, if lanes are used.
+LARGE_FILE_SIZE = 100 * 1024 * 1024
+
+# How many tasks may be waiting to start when streaming.
+STREAM_QUEUE_SIZE = 256
+
+###### Devices ###########################################################
+
+@functools.lru_cache(maxsize=4096)
+def device_for(directory:Path) -> int:
+    """Returns the device ID of the filesystem the directory is on. If the
+    directory doesn't exist yet (as is usually the case with target
+    folders), the closest parent that does exist is used instead.
+    Returns None if the device can't be figured out."""
+    for d in (directory, *directory.parents):
+        try:
+            return os.stat(d).st_dev
+        except OSError:
+            continue
+    return None
+
+###### Per-device concurrency ############################################
+
+class DeviceThrottle:
+    """Keeps track of the operations in flight on one device and adjusts
+    how many of them may be in flight at once.
+
+    Every `window` seconds, the throughput of the past window is compared
+    with the one before. If things got faster, the limit keeps moving in
+    the same direction; if not, it turns around. So the limit climbs until
+    throughput stops improving, and then hovers around the sweet spot."""
+
+    def __init__(self,device:int,max_limit:int,window:float):
+        self.device = device
+        self.limit = 1
+        self.max_limit = max_limit
+        self.window = window
+        self.in_flight = 0
+        self.total_bytes = 0
+        self.total_time = 0.0
+        self.best_limit = 1
+        self.best_throughput = 0.0
+        # Set when a task had to wait for this device during the window.
+        # No point in raising a limit nobody is bumping against.
+        self.saturated = False
+        self._step = 1
+        self._window_bytes = 0
+        self._window_start = time.monotonic()
+        self._last_throughput = None
+
+    def restart_window(self):
+        """Start a new measurement window, e.g. after sitting idle."""
+        self._window_bytes = 0
+        self._window_start = time.monotonic()
+
+    def can_start(self) -> bool:
+        return self.in_flight < self.limit
+
+    def started(self):
+        self.in_flight += 1
+
+    def finished(self,size:int,now:float):
+        self.in_flight -= 1
+        self.total_bytes += size
+        self._window_bytes += size
+        elapsed = now - self._window_start
+        if elapsed < self.window:
+            return
+        self.total_time += elapsed
+        throughput = self._window_bytes / elapsed
+        if throughput > self.best_throughput:
+            self.best_throughput = throughput
+            self.best_limit = self.limit
+        if self._last_throughput is not None and throughput <= self._last_throughput * 1.05:
+            # No real improvement from the last change, so turn around.
+            self._step = -self._step
+        if self._step < 0 or self.saturated:
+            old_limit = self.limit
+            self.limit = max(1, min(self.max_limit, self.limit + self._step))
+            if self.limit != old_limit:
+                logger.debug(f"Device {self.device}: {human_size(int(throughput))}/s "+
+                             f"with {old_limit} in flight, limit now {self.limit}")
+        self._last_throughput = throughput
+        self._window_bytes = 0
+        self._window_start = now
+        self.saturated = False
+
+###### Scheduler #########################################################
+
+class _EndOfTasks:
+    """Marks the end of a task stream, and the error that ended it, if any."""
+    def __init__(self,error:BaseException=None):
+        self.error = error
+
+class IOScheduler:
+    """Runs tasks on a pool of worker threads, keeping the number of
+    operations in flight on each device within its `DeviceThrottle` limit.
+
+    Each task must have a `devices` attribute (a tuple of the device IDs it
+    reads from and writes to) and an `io_size()` method telling how many
+    bytes it moves.
+
+    Tasks are started in the given `order`. (The rated-first and
+    newest-first orders need `rating` and `pertinent_date` attributes too.)
+    With `lanes`, large files (videos, mostly) wait in a line of their own,
+    and may take up at most half of the device's slots while there are
+    small files waiting. So the big streaming copies keep going while the
+    small files keep trickling past them."""
+
+    def __init__(self,order:Configuration.QueueOrder=Configuration.QueueOrder.WALK,lanes:bool=False,
+                 max_workers:int=16,max_per_device:int=8,window:float=1.0):
+        self.order = order
+        self.lanes = lanes
+        self.max_workers = max_workers
+        self.max_per_device = max_per_device
+        self.window = window
+        self.throttles:dict = {}
+
+    def throttle(self,device:int) -> DeviceThrottle:
+        if device not in self.throttles:
+            self.throttles[device] = DeviceThrottle(device,self.max_per_device,self.window)
+        return self.throttles[device]
+
+    @staticmethod
+    def _run_task(task) -> int:
+        # Size has to be checked before execution, since the file may be
+        # moved away.
+        size = task.io_size()
+        task.execute()
+        return size
+
+    def ordered(self,tasks:list) -> list:
+        """Returns the tasks in the order they should be started."""
+        match self.order:
+            case Configuration.QueueOrder.LARGEST_FIRST:
+                return sorted(tasks,key=lambda t: t.io_size(),reverse=True)
+            case Configuration.QueueOrder.RATED_FIRST:
+                return sorted(tasks,key=lambda t: t.rating,reverse=True)
+            case Configuration.QueueOrder.NEWEST_FIRST:
+                oldest = datetime.datetime.min
+                return sorted(tasks,key=lambda t: t.pertinent_date or oldest,reverse=True)
+            case _:
+                return tasks
+
+    def _add_to_line(self,lines:dict,task):
+        # Tasks that use the same devices (and are in the same lane) wait
+        # in the same line. The line key is (devices, is large file).
+        large = self.lanes and task.io_size() >= LARGE_FILE_SIZE
+        lines.setdefault((task.devices,large), deque()).append(task)
+
+    def run(self,tasks:list,on_done=None):
+        """Run all of the tasks. `on_done(task)` is called in the calling
+        thread as each task finishes. Exceptions from tasks are re-raised."""
+        lines:dict = {}
+        for task in self.ordered(tasks):
+            self._add_to_line(lines,task)
+        self._run_lines(lines,on_done)
+
+    def run_streaming(self,tasks:Iterable,on_done=None,max_queued:int=STREAM_QUEUE_SIZE):
+        """Run tasks as they come out of `tasks`, which is consumed in a
+        background thread. At most `max_queued` tasks wait around at any
+        time, so the walker doesn't run far ahead of the workers, and memory
+        use stays flat no matter how many tasks there are. The tasks are
+        started in the order they come in."""
+        arrivals = queue.Queue(maxsize=max_queued)
+        def produce():
+            try:
+                for task in tasks:
+                    arrivals.put(task)
+            except BaseException as error:
+                arrivals.put(_EndOfTasks(error))
+            else:
+                arrivals.put(_EndOfTasks())
+        # A daemon thread, so that a failing task doesn't leave the
+        # process hanging on a walker stuck with a full queue.
+        walker = threading.Thread(target=produce,name='ImportWalker',daemon=True)
+        walker.start()
+        self._run_lines({},on_done,arrivals,max_queued)
+
+    def _run_lines(self,lines:dict,on_done,arrivals:queue.Queue=None,max_queued:int=0):
+        # Tasks running from each line; lines come and go as they fill up and empty.
+        line_running:defaultdict = defaultdict(int)
+        running:dict = {}
+        walking = arrivals is not None
+        # Time spent idle between runs (in watch mode) doesn't count.
+        for throttle in self.throttles.values():
+            throttle.restart_window()
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix='ImportWorker') as pool:
+            while walking or lines or running:
+                # Take in whatever the walker has found, as long as there's
+                # room. Only wait for it if there's nothing else to do.
+                queued = sum(len(line) for line in lines.values())
+                while walking and queued < max_queued:
+                    try:
+                        task = arrivals.get(block=not (lines or running))
+                    except queue.Empty:
+                        break
+                    if isinstance(task,_EndOfTasks):
+                        walking = False
+                        if task.error is not None:
+                            raise task.error
+                        break
+                    self._add_to_line(lines,task)
+                    queued += 1
+                if not (lines or running):
+                    continue
+                self._start_ready(lines,line_running,running,pool)
+                # While the walker is still going, check back every now and
+                # then to pick up new tasks.
+                timeout = 0.1 if walking and queued < max_queued else None
+                done, _ = wait(running,timeout=timeout,return_when=FIRST_COMPLETED)
+                now = time.monotonic()
+                for future in done:
+                    task, throttles, key = running.pop(future)
+                    line_running[key] -= 1
+                    size = future.result()
+                    for throttle in throttles:
+                        throttle.finished(size,now)
+                    if on_done is not None:
+                        on_done(task)
+        for throttle in self.throttles.values():
+            logger.info(f"Device {throttle.device}: {human_size(throttle.total_bytes)} moved, "+
+                        f"best throughput {human_size(int(throttle.best_throughput))}/s "+
+                        f"with {throttle.best_limit} in flight")
+
+    def _start_ready(self,lines:dict,line_running:dict,running:dict,pool:ThreadPoolExecutor):
+        """Start as many waiting tasks as the device limits allow."""
+        # Large file lines go first, so that they get their share of the slots.
+        for key in sorted(lines.keys(),key=lambda key: not key[1]):
+            devices, large = key
+            line = lines[key]
+            throttles = [self.throttle(d) for d in set(devices)]
+            # Large files get at most half of the slots while small files are
+            # waiting, rounded down, so at the start of the run (one slot)
+            # the small files go first.
+            if large and (devices,False) in lines:
+                lane_limit = min(t.limit for t in throttles) // 2
+            else:
+                lane_limit = None
+            while line and len(running) < self.max_workers:
+                if lane_limit is not None and line_running[key] >= lane_limit:
+                    break
+                if not all(t.can_start() for t in throttles):
+                    for t in throttles:
+                        if not t.can_start():
+                            t.saturated = True
+                    break
+                task = line.popleft()
+                for t in throttles:
+                    t.started()
+                line_running[key] += 1
+                running[pool.submit(IOScheduler._run_task,task)] = (task,throttles,key)
+            if not line:
+                del lines[key]
+
+    def print_device_stats(self):
+        """Prints out how each device fared."""
+        if len(self.throttles) == 0:
+            return
+        print("\n[bright_white]Devices:[/bright_white]")
+        for throttle in self.throttles.values():
+            if throttle.total_bytes == 0:
+                continue
+            print(f" - Device {throttle.device}: {human_size(throttle.total_bytes)}, "+
+                  f"best {human_size(int(throttle.best_throughput))}/s "+
+                  f"with {throttle.best_limit} at a time")
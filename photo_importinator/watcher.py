@@ -0,0 +1,191 @@
+#!/usr/bin/python
+##########################################################################
+# Photo Importinator III: This Time It's Python For Some Reason
+##########################################################################
+# (c) 2026 Rose Midford.
+# Distributed under the MIT license. See the LICENSE file in parent folder
+# for the full license terms.
+
+import os
+import stat
+import time
+import threading
+from pathlib import Path
+import logging
+
+# watchdog is optional. Without it, the folders are polled.
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = logging.getLogger(__name__)
+
+###### File system events ################################################
+
+class _EventHandler(FileSystemEventHandler):
+    """Passes the paths watchdog tells about to the watcher."""
+
+    def __init__(self,watcher:'SourceWatcher'):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self,event):
+        paths = [event.src_path]
+        if getattr(event,'dest_path',''):
+            paths.append(event.dest_path)
+        for path in paths:
+            path = Path(os.fsdecode(path))
+            if event.is_directory:
+                # A folder moved in doesn't necessarily tell about its files.
+                if event.event_type in ('created','moved') and path.is_dir():
+                    for file in SourceWatcher.files_in(path):
+                        self.watcher.touched(file)
+            else:
+                self.watcher.touched(path)
+
+###### Watcher ###########################################################
+
+class SourceWatcher:
+    """Watches the source folders for new and changed files, and hands them
+    out in batches once they have settled, i.e. haven't changed for
+    `settle_time` seconds, so that files still being synced aren't imported
+    half-way through. Files that have been handed out aren't handed out
+    again unless they change.
+
+    Uses watchdog (inotify on Linux, ReadDirectoryChangesW on Windows) if
+    it's installed. Otherwise, the folders are polled every `poll_interval`
+    seconds, which only needs a `stat` of each file, but still isn't free
+    for big folders."""
+
+    def __init__(self,directories:list,settle_time:float=2.0,poll_interval:float=5.0,max_batch:int=100):
+        self.directories = directories
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._changed:set = set()
+        # Files that are changing: path -> (signature, time of last change)
+        self._pending:dict = {}
+        # Files handed out: path -> signature
+        self._seen:dict = {}
+        self._observer = None
+
+    @property
+    def polling(self) -> bool:
+        return self._observer is None
+
+    @staticmethod
+    def files_in(directory:Path):
+        for root, dirs, files in os.walk(directory):
+            root = Path(root)
+            for file in files:
+                yield root / file
+
+    @staticmethod
+    def _signature(path:Path) -> tuple:
+        """Size and modification time, or None if it's not a file (anymore)."""
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(file_stat.st_mode):
+            return None
+        return (file_stat.st_size, file_stat.st_mtime_ns)
+
+    def touched(self,path:Path):
+        """Note that something happened to the file. Called from the
+        watchdog thread."""
+        with self._lock:
+            self._changed.add(path)
+        self._wakeup.set()
+
+    def start(self):
+        """Start watching. Files already in the folders count as new."""
+        if Observer is not None:
+            self._observer = Observer()
+            handler = _EventHandler(self)
+            for directory in self.directories:
+                self._observer.schedule(handler,str(directory),recursive=True)
+            self._observer.start()
+            logger.info(f"Watching {len(self.directories)} folders for changes")
+        else:
+            logger.info(f"watchdog not installed, polling {len(self.directories)} folders "+
+                        f"every {self.poll_interval} s")
+        self._poll()
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def _poll(self):
+        """Look for files that have changed since they were handed out."""
+        for directory in self.directories:
+            for file in SourceWatcher.files_in(directory):
+                signature = SourceWatcher._signature(file)
+                if signature is not None and self._seen.get(file) != signature:
+                    self.touched(file)
+
+    def _take_changes(self,now:float):
+        with self._lock:
+            changed = self._changed
+            self._changed = set()
+        for path in changed:
+            signature = SourceWatcher._signature(path)
+            if signature is None:
+                # Gone (most likely imported, i.e. moved away).
+                self._pending.pop(path,None)
+                self._seen.pop(path,None)
+                continue
+            if self._seen.get(path) == signature:
+                continue
+            pending = self._pending.get(path)
+            if pending is None or pending[0] != signature:
+                self._pending[path] = (signature, now)
+
+    def _settled(self,now:float) -> list:
+        settled = []
+        for path, (signature, since) in list(self._pending.items()):
+            if now - since < self.settle_time:
+                continue
+            current = SourceWatcher._signature(path)
+            if current is None:
+                del self._pending[path]
+                continue
+            if current != signature:
+                self._pending[path] = (current, now)
+                continue
+            del self._pending[path]
+            self._seen[path] = signature
+            settled.append(path)
+            if len(settled) >= self.max_batch:
+                break
+        return settled
+
+    def batches(self):
+        """Yields lists of settled files, until interrupted."""
+        next_poll = time.monotonic() + self.poll_interval
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            if self.polling and now >= next_poll:
+                self._poll()
+                next_poll = now + self.poll_interval
+            self._take_changes(now)
+            settled = self._settled(now)
+            if settled:
+                yield settled
+                continue
+            # Nothing to do; sleep until something changes, or the next
+            # pending file may have settled (or it's time to poll). Wake up
+            # every second anyway, as Ctrl+C doesn't get through an endless
+            # wait on Windows.
+            timeouts = [since + self.settle_time - now for _, since in self._pending.values()]
+            if self.polling:
+                timeouts.append(next_poll - now)
+            self._wakeup.wait(max(0.05, min(timeouts + [1.0])))